@@ -0,0 +1,105 @@
+import sys
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from music_db import get_db
+
+# ---------------- musicDB indexes ----------------
+# Every service calls ensure_indexes(db) at startup; creating an index that
+# already exists is a no-op, so this is safe to run from all of them at once.
+# check_query_plans(db) runs explain() on each hot query and reports the ones
+# whose winning plan still contains a COLLSCAN.
+#
+#   python mongo_indexes.py           create the indexes, then check the plans
+#   python mongo_indexes.py --check   only check (exit code 1 on a COLLSCAN)
+
+# GridFS bucket of the FER images (store_fer_images.py); GridFS.put() stores
+# extra fields such as `emotion` on the files document
+IMAGE_BUCKET = "image"
+
+# (collection, index name, keys)
+INDEXES = [
+    ("songs", "song_emotion_1", [("song_emotion", ASCENDING)]),  # working_api: songs / counts per emotion
+    ("songs", "title_1", [("title", ASCENDING)]),                # recommend.py: title matches
+    ("songs", "filename_1", [("filename", ASCENDING)]),          # audio route: lookup by filename
+    ("songs", "updated_at_1", [("updated_at", ASCENDING)]),      # recommend.py --update: changed songs
+    (f"{IMAGE_BUCKET}.files", "emotion_1", [("emotion", ASCENDING)]),  # FER images per emotion
+]
+
+# (description, collection, filter) of the queries that must use an index
+HOT_QUERIES = [
+    ("songs by emotion", "songs", {"song_emotion": "happy"}),
+    ("song by title", "songs", {"title": "Believer"}),
+    ("song by filename", "songs", {"filename": "believer.mp3"}),
+    ("songs changed since", "songs", {"updated_at": {"$gt": 0}}),
+    ("FER images by emotion", f"{IMAGE_BUCKET}.files", {"emotion": "happy"}),
+]
+
+
+def ensure_indexes(db):
+    """Create the missing indexes; returns the names of the ones created"""
+    created = []
+    for collection, name, keys in INDEXES:
+        existing = db[collection].index_information()
+        if name in existing or any(info["key"] == keys for info in existing.values()):
+            continue
+        try:
+            db[collection].create_index(keys, name=name)
+            created.append(f"{collection}.{name}")
+        except OperationFailure as e:
+            # Another service created the same keys under another name in the meantime
+            if e.code not in (85, 86):  # IndexOptionsConflict / IndexKeySpecsConflict
+                raise
+    if created:
+        print(f"✅ Created indexes: {', '.join(created)}")
+    return created
+
+
+def _stages(plan):
+    """Every stage name in an explain() plan tree"""
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _stages(plan[child])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def check_query_plans(db):
+    """{description: winning-plan stages} for every hot query that does a COLLSCAN"""
+    problems = {}
+    for description, collection, query in HOT_QUERIES:
+        plan = db[collection].find(query).explain()["queryPlanner"]["winningPlan"]
+        stages = [stage for stage in _stages(plan) if stage]
+        if "COLLSCAN" in stages:
+            problems[description] = stages
+    return problems
+
+
+def prepare_database(db, strict=False):
+    """Startup hook: ensure indexes, then verify the plans (raise instead of warn when strict)"""
+    try:
+        ensure_indexes(db)
+        problems = check_query_plans(db)
+    except OperationFailure as e:
+        # e.g. a user without createIndex rights: the service still works, just slower
+        if strict:
+            raise
+        print(f"⚠️ Index setup failed: {e}")
+        return None
+    for description, stages in problems.items():
+        print(f"⚠️ Query '{description}' still does a collection scan: {' -> '.join(stages)}")
+    if problems and strict:
+        raise RuntimeError(f"Collection scans in hot queries: {', '.join(problems)}")
+    return problems
+
+
+if __name__ == "__main__":
+    database = get_db()
+    if "--check" not in sys.argv:
+        ensure_indexes(database)
+    collscans = check_query_plans(database)
+    for query_name, plan_stages in collscans.items():
+        print(f"❌ {query_name}: {' -> '.join(plan_stages)}")
+    if collscans:
+        sys.exit(1)
+    print(f"✅ All {len(HOT_QUERIES)} hot queries use an index")
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from pymongo import MongoClient
+
+# ---------------- musicDB access ----------------
+# One pooled MongoClient per process, shared by every module that talks to
+# musicDB (a MongoClient is thread-safe and keeps its own connection pool;
+# building one per call pays the connection handshake every time).
+#
+# Catalog statistics (total and per-emotion song counts) are computed with a
+# single $group and cached for CATALOG_STATS_TTL seconds, so health checks and
+# dashboards do not count the collection on every request. Random samples use
+# server-side $sample instead of reading every document.
+#
+#   MONGO_URI, MONGO_DB
+#   MONGO_MAX_POOL_SIZE             connections per process (default 50)
+#   MONGO_MIN_POOL_SIZE             connections kept open when idle (default 0)
+#   MONGO_MAX_IDLE_MS               close connections idle this long (default 60000)
+#   MONGO_SERVER_SELECTION_TIMEOUT_MS  fail fast when the server is down (default 3000)
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.environ.get("MONGO_DB", "musicDB")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_MS = int(os.environ.get("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+CATALOG_STATS_TTL = float(os.environ.get("CATALOG_STATS_TTL", "30"))
+
+SONGS = "songs"
+
+# Read-only projections: only the fields each reader uses
+SONG_SUMMARY = {"_id": 1, "title": 1, "artist": 1, "album": 1, "filename": 1, "song_emotion": 1}
+SONG_TITLE = {"_id": 0, "title": 1, "artist": 1}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide pooled client (created on first use)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                )
+    return _client
+
+
+def get_db(name=MONGO_DB):
+    return get_client()[name]
+
+
+def ping():
+    """Raises if the server cannot be reached"""
+    get_client().admin.command("ping")
+
+
+def sample_songs(collection, n=5, match=None, projection=SONG_TITLE):
+    """n random songs picked by the server ($sample), optionally among those matching `match`"""
+    pipeline = ([{"$match": match}] if match else []) + [{"$sample": {"size": n}}, {"$project": projection}]
+    return list(collection.aggregate(pipeline))
+
+
+class CatalogStats:
+    """Song counts (total, per song_emotion) from one $group, cached for `ttl` seconds"""
+
+    def __init__(self, collection, ttl=CATALOG_STATS_TTL):
+        self.collection = collection
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = None
+        self._expires = 0.0
+        self.refreshes = 0
+        self.hits = 0
+
+    def get(self):
+        """{"total": n, "by_emotion": {emotion: n}, "computed_at": timestamp}"""
+        now = time.time()
+        with self._lock:
+            if self._stats is not None and now < self._expires:
+                self.hits += 1
+                return self._stats
+            by_emotion = {
+                doc["_id"]: doc["count"]
+                for doc in self.collection.aggregate([{"$group": {"_id": "$song_emotion", "count": {"$sum": 1}}}])
+            }
+            self._stats = {
+                "total": sum(by_emotion.values()),
+                "by_emotion": {emotion: n for emotion, n in by_emotion.items() if emotion is not None},
+                "computed_at": now,
+            }
+            self._expires = now + self.ttl
+            self.refreshes += 1
+            return self._stats
+
+    def count(self, emotion=None):
+        stats = self.get()
+        return stats["total"] if emotion is None else stats["by_emotion"].get(emotion, 0)
+
+    def estimated_total(self):
+        """Total from collection metadata: no scan, may lag right after writes"""
+        return self.collection.estimated_document_count()
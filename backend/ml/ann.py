@@ -0,0 +1,198 @@
+import numpy as np
+from neighbor_table import merge_top_k, normalize_rows, top_k
+
+# -------------------------------------------------------------------
+# 🛰️ Nearest-Neighbor Engines (pure NumPy)
+# -------------------------------------------------------------------
+# Both engines work on L2-normalized float32 vectors, where the dot product
+# is the cosine similarity, and share one interface:
+#
+#   index.search(queries, k, exclude=None) -> (indices int32, similarities float32)
+#   index.to_arrays() / ENGINE.from_arrays(arrays, params)   (artifact storage)
+#
+# "brute" compares every query with the whole catalog (exact, cost grows
+# linearly with the catalog). "ivf" clusters the catalog with spherical
+# k-means and only scans the `nprobe` clusters closest to each query; raise
+# nprobe for recall, lower it for latency.
+
+INDEX_TYPES = ("brute", "ivf")
+
+# Queries x catalog similarities per block in the brute-force search
+MAX_BLOCK_ELEMENTS = 2 ** 25
+
+
+def _exclude(sims, candidate_rows, exclude):
+    """Mask each query's own row (exclude[q]) in a block of similarities"""
+    if exclude is not None:
+        sims[candidate_rows[np.newaxis, :] == np.asarray(exclude)[:, np.newaxis]] = -np.inf
+
+
+class BruteForceIndex:
+    """Exact cosine search over the whole catalog"""
+
+    index_type = "brute"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors, **params):
+        return cls(normalize_rows(vectors))
+
+    def search(self, queries, k, exclude=None):
+        queries = normalize_rows(queries)
+        n = len(self.vectors)
+        rows = np.arange(n)
+        indices = np.full((len(queries), k), -1, dtype=np.int32)
+        values = np.zeros((len(queries), k), dtype=np.float32)
+
+        block = max(1, MAX_BLOCK_ELEMENTS // max(n, 1))
+        for start in range(0, len(queries), block):
+            stop = min(start + block, len(queries))
+            sims = queries[start:stop] @ self.vectors.T
+            _exclude(sims, rows, None if exclude is None else exclude[start:stop])
+            indices[start:stop], values[start:stop] = top_k(sims, k)
+        return indices, values
+
+    def build_like(self, vectors):
+        """Same kind of index over another set of vectors (e.g. one language)"""
+        return BruteForceIndex.build(vectors)
+
+    def updated(self, vectors, rows):
+        """Index over the updated catalog after `rows` changed or were appended"""
+        return BruteForceIndex(vectors)
+
+    def to_arrays(self):
+        return {}, {}
+
+    @classmethod
+    def from_arrays(cls, vectors, arrays, params):
+        return cls(vectors)
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means lists, scan only the nearest `nprobe` lists"""
+
+    index_type = "ivf"
+
+    def __init__(self, centroids, list_offsets, list_rows, list_vectors, nprobe):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.list_vectors = list_vectors
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, nprobe=8, n_iter=10, sample_size=None, seed=42):
+        vectors = normalize_rows(vectors)
+        n = len(vectors)
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(seed)
+
+        # Fit centroids on a sample; assignment of the full catalog follows
+        sample_size = min(n, sample_size or 64 * n_lists)
+        sample = vectors[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assign = cls._assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return cls(centroids, list_offsets, order, vectors[order], min(nprobe, n_lists))
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        assign = np.empty(len(vectors), dtype=np.int64)
+        block = max(1, MAX_BLOCK_ELEMENTS // max(len(centroids), 1))
+        for start in range(0, len(vectors), block):
+            assign[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return assign
+
+    def search(self, queries, k, exclude=None, nprobe=None):
+        queries = normalize_rows(queries)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        n_queries = len(queries)
+
+        probes, _ = top_k(queries @ self.centroids.T, nprobe)
+        indices = np.full((n_queries, k), -1, dtype=np.int32)
+        values = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        exclude = None if exclude is None else np.asarray(exclude)
+
+        # Visit each probed list once, scoring all queries that probe it together
+        probed_lists = probes.ravel()
+        query_ids = np.repeat(np.arange(n_queries), nprobe)
+        order = np.argsort(probed_lists, kind="stable")
+        probed_lists, query_ids = probed_lists[order], query_ids[order]
+        bounds = np.flatnonzero(np.diff(probed_lists)) + 1
+        for lst, qs in zip(np.split(probed_lists, bounds), np.split(query_ids, bounds)):
+            if len(lst) == 0:
+                continue
+            start, stop = self.list_offsets[lst[0]], self.list_offsets[lst[0] + 1]
+            if start == stop:
+                continue
+            rows = self.list_rows[start:stop]
+            sims = queries[qs] @ self.list_vectors[start:stop].T
+            _exclude(sims, rows, None if exclude is None else exclude[qs])
+            cand_idx = np.broadcast_to(rows, sims.shape)
+            indices[qs], values[qs] = merge_top_k(indices[qs], values[qs], cand_idx, sims, k)
+
+        missing = ~np.isfinite(values)
+        indices[missing] = -1
+        values[missing] = 0.0
+        return indices, values
+
+    def build_like(self, vectors):
+        """Same kind of index over another set of vectors (e.g. one language)"""
+        return IVFIndex.build(vectors, nprobe=self.nprobe)
+
+    def updated(self, vectors, rows):
+        """
+        Index over the updated catalog after `rows` changed or were appended.
+        Centroids are kept; only the changed vectors are re-assigned to lists.
+        """
+        n_lists = len(self.centroids)
+        assign = np.zeros(len(vectors), dtype=np.int64)
+        assign[self.list_rows] = np.repeat(np.arange(n_lists), np.diff(self.list_offsets))
+        rows = np.asarray(rows, dtype=np.int64)
+        assign[rows] = self._assign(normalize_rows(vectors[rows]), self.centroids)
+
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return IVFIndex(self.centroids, list_offsets, order, np.asarray(vectors)[order], self.nprobe)
+
+    def to_arrays(self):
+        arrays = {
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "list_rows": self.list_rows,
+            "list_vectors": self.list_vectors,
+        }
+        return arrays, {"nprobe": int(self.nprobe), "n_lists": int(len(self.centroids))}
+
+    @classmethod
+    def from_arrays(cls, vectors, arrays, params):
+        return cls(
+            arrays["centroids"], arrays["list_offsets"], arrays["list_rows"],
+            arrays["list_vectors"], params["nprobe"]
+        )
+
+
+ENGINES = {"brute": BruteForceIndex, "ivf": IVFIndex}
+
+
+def build_index(vectors, index_type="brute", **params):
+    """Build the nearest-neighbor engine selected at train time"""
+    if index_type not in ENGINES:
+        raise ValueError(f"Unknown index type: '{index_type}'. Use one of {INDEX_TYPES}")
+    return ENGINES[index_type].build(vectors, **params)
@@ -0,0 +1,73 @@
+import argparse
+import time
+import numpy as np
+from ann import build_index
+from neighbor_table import build_neighbor_table, lookup_neighbors, NEIGHBOR_TABLE_K
+
+# -------------------------------------------------------------------
+# ⏱️ Neighbor Table Build Benchmark
+# -------------------------------------------------------------------
+# Builds the top-K table for synthetic catalogs of increasing size and shows
+# how build time scales (all-pairs similarity is roughly quadratic; --index ivf
+# fills the table through the approximate engine instead) and how
+# big the stored arrays get.
+#
+#   python backend/ml/bench_neighbor_table.py --sizes 1000 5000 10000 20000
+#   python backend/ml/bench_neighbor_table.py --index ivf --sizes 10000 100000
+
+N_FEATURES = 9
+LANGUAGES = ["English", "Nepali", "Hindi"]
+
+
+def synthetic_catalog(n_songs, seed=42):
+    """Standardized-looking song features and a language label per song"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_songs, N_FEATURES)).astype(np.float32)
+    languages = rng.choice(LANGUAGES, size=n_songs)
+    return X, languages
+
+
+def table_bytes(table):
+    total = table["indices"].nbytes + table["similarities"].nbytes
+    for language_table in table["languages"].values():
+        total += language_table["indices"].nbytes + language_table["similarities"].nbytes
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark neighbor table build time")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 20000, 50000])
+    parser.add_argument("--k", type=int, default=NEIGHBOR_TABLE_K)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--index", choices=["brute", "ivf"], default="brute")
+    args = parser.parse_args()
+
+    print(f"{'songs':>10} {'build (s)':>10} {'songs/s':>10} {'vs prev':>8} {'table MB':>9} {'lookup (us)':>12}")
+    prev_n, prev_t = None, None
+    for n_songs in args.sizes:
+        X, languages = synthetic_catalog(n_songs)
+
+        start = time.perf_counter()
+        index = build_index(X, args.index)
+        table = build_neighbor_table(X, k=args.k, languages=languages, index=index)
+        build_time = time.perf_counter() - start
+
+        rows = np.random.default_rng(0).integers(0, n_songs, size=args.lookups)
+        start = time.perf_counter()
+        for row in rows:
+            lookup_neighbors(table, int(row), 5)
+        lookup_us = (time.perf_counter() - start) / args.lookups * 1e6
+
+        # Time ratio next to size ratio: x4 time for x2 songs means quadratic
+        growth = f"x{build_time / prev_t:.1f}" if prev_t else "-"
+        print(
+            f"{n_songs:>10} {build_time:>10.2f} {n_songs / build_time:>10.0f} {growth:>8}"
+            f" {table_bytes(table) / 1e6:>9.1f} {lookup_us:>12.1f}"
+        )
+        if prev_n:
+            print(f"{'':>10} (catalog x{n_songs / prev_n:.1f})")
+        prev_n, prev_t = n_songs, build_time
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import os
+import shutil
+import numpy as np
+from ann import ENGINES
+
+# -------------------------------------------------------------------
+# 🗄️ Columnar Recommender Artifact
+# -------------------------------------------------------------------
+# Layout of models/song_recommender/:
+#
+#   CURRENT                       -> name of the live version directory
+#   v<version>/manifest.json      -> features, scaler stats, table sizes, ...
+#   v<version>/<array>.npy        -> float32 / int32 arrays, loaded with mmap
+#   v<version>/meta.<col>.*.npy   -> title / filename / language / _id
+#   v<version>/ann.*.npy          -> nearest-neighbor engine arrays (ann.py)
+#
+# Every array is opened with np.load(mmap_mode="r"), so loading is a few
+# file opens and all worker processes share the same page-cache pages.
+# A version directory is never modified after it is written; training
+# writes a new one and then swaps CURRENT.
+#
+# The directory is machine-local and ignored by git: a fresh checkout builds
+# it with `recommend.py --convert` (from the shipped song_recommender.joblib)
+# or `recommend.py --train` (from MongoDB).
+
+ARTIFACT_FORMAT = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+KEEP_VERSIONS = 3
+
+
+class StringColumn:
+    """Read-only string column stored as one UTF-8 buffer plus row offsets"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [("" if v is None or v != v else str(v)).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+
+class CategoricalColumn:
+    """Read-only low-cardinality column: int16 codes into a list of categories"""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = list(categories)
+
+    @classmethod
+    def from_values(cls, values):
+        labels = ["" if v is None or v != v else str(v) for v in values]
+        categories = sorted(set(labels))
+        lookup = {c: i for i, c in enumerate(categories)}
+        return cls(np.array([lookup[l] for l in labels], dtype=np.int16), categories)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.categories[self.codes[row]]
+
+    def rows_equal(self, value):
+        """Row positions whose value equals `value` (empty if unknown)"""
+        if value not in self.categories:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.codes == self.categories.index(value))
+
+    def to_list(self):
+        return [self.categories[c] for c in self.codes]
+
+
+def _flatten(package):
+    """Split a model package into {file name: array} and a JSON manifest"""
+    arrays = {
+        "features": package["X"],
+        "normalized": package["X_normalized"],
+    }
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": package["version"],
+        "features": package["features"],
+        "data_source": package["data_source"],
+        "n_songs": int(package["X"].shape[0]),
+        "scaler": {
+            "mean": [float(v) for v in package["scaler_mean"]],
+            "scale": [float(v) for v in package["scaler_scale"]],
+        },
+        "extra": package.get("extra", {}),
+    }
+
+    table = package.get("neighbor_table")
+    if table is not None:
+        arrays["neighbors.indices"] = table["indices"]
+        arrays["neighbors.similarities"] = table["similarities"]
+        languages = list(table["languages"])
+        for i, language in enumerate(languages):
+            arrays[f"neighbors.lang{i}.indices"] = table["languages"][language]["indices"]
+            arrays[f"neighbors.lang{i}.similarities"] = table["languages"][language]["similarities"]
+        manifest["neighbor_table"] = {"k": table["k"], "language_k": table["language_k"], "languages": languages}
+
+    ann_index = package.get("ann_index")
+    if ann_index is not None:
+        ann_arrays, params = ann_index.to_arrays()
+        for key, value in ann_arrays.items():
+            arrays[f"ann.{key}"] = value
+        manifest["ann"] = {"type": ann_index.index_type, "arrays": list(ann_arrays), "params": params}
+
+    index = package.get("title_index")
+    if index is not None:
+        for key, value in index.items():
+            arrays[f"title_index.{key}"] = value
+        manifest["title_index"] = list(index)
+
+    manifest["metadata"] = {}
+    for name, column in package["metadata"].items():
+        if isinstance(column, CategoricalColumn):
+            arrays[f"meta.{name}.codes"] = column.codes
+            manifest["metadata"][name] = {"type": "categorical", "categories": column.categories}
+        else:
+            arrays[f"meta.{name}.data"] = column.data
+            arrays[f"meta.{name}.offsets"] = column.offsets
+            manifest["metadata"][name] = {"type": "string"}
+
+    return arrays, manifest
+
+
+def save_model(model_dir, package):
+    """Write the package as a new version directory and make it the live one"""
+    os.makedirs(model_dir, exist_ok=True)
+    arrays, manifest = _flatten(package)
+
+    version_name = f"v{package['version']}"
+    final_dir = os.path.join(model_dir, version_name)
+    tmp_dir = os.path.join(model_dir, f".tmp-{version_name}-{os.getpid()}")
+    os.makedirs(tmp_dir)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(tmp_dir, final_dir)
+
+    # Readers follow CURRENT; replacing it is the atomic switch to the new version
+    pointer_tmp = os.path.join(model_dir, f".{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version_name)
+    os.replace(pointer_tmp, os.path.join(model_dir, CURRENT_FILE))
+
+    _prune_versions(model_dir, keep=version_name)
+    return final_dir
+
+
+def _prune_versions(model_dir, keep):
+    versions = sorted(d for d in os.listdir(model_dir) if d.startswith("v") and d != keep)
+    for old in versions[:max(0, len(versions) - (KEEP_VERSIONS - 1))]:
+        # Processes still mapping an old version keep their pages; on Windows the
+        # delete fails while files are open, and the next save tries again
+        shutil.rmtree(os.path.join(model_dir, old), ignore_errors=True)
+
+
+def current_version_file(model_dir):
+    return os.path.join(model_dir, CURRENT_FILE)
+
+
+def load_model(model_dir, version_name):
+    """Open a version directory with every array memory-mapped"""
+    version_dir = os.path.join(model_dir, version_name)
+    with open(os.path.join(version_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    def array(name):
+        path = os.path.join(version_dir, f"{name}.npy")
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            # Zero-length arrays cannot be mapped
+            return np.load(path)
+
+    package = {
+        "version": manifest["version"],
+        "features": manifest["features"],
+        "data_source": manifest["data_source"],
+        "scaler_mean": np.array(manifest["scaler"]["mean"], dtype=np.float32),
+        "scaler_scale": np.array(manifest["scaler"]["scale"], dtype=np.float32),
+        "extra": manifest.get("extra", {}),
+        "X": array("features"),
+        "X_normalized": array("normalized"),
+        "neighbor_table": None,
+        "ann_index": None,
+        "title_index": None,
+        "metadata": {},
+    }
+
+    ann = manifest.get("ann")
+    if ann is not None:
+        ann_arrays = {key: array(f"ann.{key}") for key in ann["arrays"]}
+        package["ann_index"] = ENGINES[ann["type"]].from_arrays(package["X_normalized"], ann_arrays, ann["params"])
+
+    table = manifest.get("neighbor_table")
+    if table is not None:
+        package["neighbor_table"] = {
+            "k": table["k"],
+            "language_k": table["language_k"],
+            "indices": array("neighbors.indices"),
+            "similarities": array("neighbors.similarities"),
+            "languages": {
+                language: {
+                    "indices": array(f"neighbors.lang{i}.indices"),
+                    "similarities": array(f"neighbors.lang{i}.similarities"),
+                }
+                for i, language in enumerate(table["languages"])
+            },
+        }
+
+    if manifest.get("title_index") is not None:
+        package["title_index"] = {key: array(f"title_index.{key}") for key in manifest["title_index"]}
+
+    for name, spec in manifest["metadata"].items():
+        if spec["type"] == "categorical":
+            package["metadata"][name] = CategoricalColumn(array(f"meta.{name}.codes"), spec["categories"])
+        else:
+            package["metadata"][name] = StringColumn(array(f"meta.{name}.data"), array(f"meta.{name}.offsets"))
+
+    return package
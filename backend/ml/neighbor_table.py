@@ -0,0 +1,258 @@
+import numpy as np
+
+# -------------------------------------------------------------------
+# 🧭 Precomputed Top-K Neighbor Table
+# -------------------------------------------------------------------
+# The catalog only changes at training time, so every song's nearest
+# neighbors (cosine similarity on the scaled features) are computed once
+# and stored as int32 indices / float32 similarities. Unused slots (catalog
+# or language group smaller than K) hold index -1.
+
+NEIGHBOR_TABLE_K = 20
+LANGUAGE_TABLE_K = 10
+
+# Rows per block of the similarity matrix (block is rows x catalog floats)
+MAX_BLOCK_ELEMENTS = 2 ** 25
+
+# Songs queried per call when the table is built through an ANN index
+ANN_QUERY_BLOCK = 4096
+
+
+def normalize_rows(X):
+    """L2-normalize rows as float32 so a dot product is the cosine similarity"""
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def top_k(sims, k):
+    """Column indices and values of the k largest entries per row, best first"""
+    n_cols = sims.shape[1]
+    k_eff = min(k, n_cols)
+    indices = np.full((sims.shape[0], k), -1, dtype=np.int32)
+    values = np.zeros((sims.shape[0], k), dtype=np.float32)
+    if k_eff == 0:
+        return indices, values
+
+    part = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+    part_vals = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_vals, axis=1, kind="stable")
+    top = np.take_along_axis(part, order, axis=1)
+    top_vals = np.take_along_axis(part_vals, order, axis=1)
+
+    # The seed itself is masked with -inf; never report it as a neighbor
+    valid = np.isfinite(top_vals)
+    indices[:, :k_eff] = np.where(valid, top, -1)
+    values[:, :k_eff] = np.where(valid, top_vals, 0.0)
+    return indices, values
+
+
+def build_neighbor_table(X_scaled, k=NEIGHBOR_TABLE_K, languages=None, language_k=LANGUAGE_TABLE_K, index=None):
+    """
+    Compute each song's top-k cosine neighbors (excluding itself).
+
+    If `languages` is given (one label per row), also compute for every song
+    its top-`language_k` neighbors within each language, so language-filtered
+    queries are a lookup too. Returns a dict ready to store in the model package.
+
+    With an approximate `index` (see ann.py) the table is filled by querying
+    it instead of computing all pairs, which keeps very large catalogs buildable.
+    """
+    Xn = normalize_rows(X_scaled)
+    n_songs = Xn.shape[0]
+
+    indices = np.full((n_songs, k), -1, dtype=np.int32)
+    similarities = np.zeros((n_songs, k), dtype=np.float32)
+
+    language_cols = {}
+    language_tables = {}
+    if languages is not None:
+        labels = language_labels(languages)
+        for language in np.unique(labels):
+            language_cols[language] = np.flatnonzero(labels == language).astype(np.int32)
+            language_tables[language] = _empty_table(n_songs, language_k)
+
+    if index is not None and index.index_type != "brute":
+        _fill_from_index(Xn, index, indices, similarities, language_cols, language_tables)
+        return _table(k, indices, similarities, language_k, language_tables)
+
+    _fill_rows_exact(Xn, np.arange(n_songs), indices, similarities, language_cols, language_tables)
+    return _table(k, indices, similarities, language_k, language_tables)
+
+
+def language_labels(languages):
+    """Language per row as a string array (missing values become "")"""
+    return np.asarray(["" if l is None or l != l else str(l) for l in languages])
+
+
+def _empty_table(n_songs, k):
+    return {
+        "indices": np.full((n_songs, k), -1, dtype=np.int32),
+        "similarities": np.zeros((n_songs, k), dtype=np.float32),
+    }
+
+
+def _fill_rows_exact(Xn, rows, indices, similarities, language_cols, language_tables):
+    """Exact top-k for the given rows (global and per language), in blocks of rows x catalog"""
+    k = indices.shape[1]
+    block = max(1, MAX_BLOCK_ELEMENTS // max(len(Xn), 1))
+    for start in range(0, len(rows), block):
+        block_rows = rows[start:start + block]
+        sims = Xn[block_rows] @ Xn.T
+        sims[np.arange(len(block_rows)), block_rows] = -np.inf
+
+        indices[block_rows], similarities[block_rows] = top_k(sims, k)
+
+        for language, cols in language_cols.items():
+            table = language_tables[language]
+            local, values = top_k(sims[:, cols], table["indices"].shape[1])
+            table["indices"][block_rows] = np.where(local >= 0, cols[np.maximum(local, 0)], -1)
+            table["similarities"][block_rows] = values
+
+
+def _table(k, indices, similarities, language_k, language_tables):
+    return {
+        "k": k,
+        "indices": indices,
+        "similarities": similarities,
+        "language_k": language_k,
+        "languages": language_tables,
+    }
+
+
+def _fill_from_index(Xn, index, indices, similarities, language_cols, language_tables):
+    n_songs = len(Xn)
+    for start in range(0, n_songs, ANN_QUERY_BLOCK):
+        rows = np.arange(start, min(start + ANN_QUERY_BLOCK, n_songs))
+        indices[rows], similarities[rows] = index.search(Xn[rows], indices.shape[1], exclude=rows)
+
+    for language, cols in language_cols.items():
+        sub_index = index.build_like(Xn[cols])
+        # Position of each song inside this language (-1 if it is not in it)
+        local_pos = np.full(n_songs, -1, dtype=np.int64)
+        local_pos[cols] = np.arange(len(cols))
+        table = language_tables[language]
+        for start in range(0, n_songs, ANN_QUERY_BLOCK):
+            rows = np.arange(start, min(start + ANN_QUERY_BLOCK, n_songs))
+            local, values = sub_index.search(Xn[rows], table["indices"].shape[1], exclude=local_pos[rows])
+            table["indices"][rows] = np.where(local >= 0, cols[np.maximum(local, 0)], -1)
+            table["similarities"][rows] = values
+
+
+def merge_top_k(best_idx, best_sim, new_idx, new_sim, k):
+    """Keep the k best of two candidate sets per row (empty slots: -1 / -inf)"""
+    indices = np.concatenate([best_idx, new_idx], axis=1)
+    sims = np.concatenate([best_sim, new_sim], axis=1)
+    local, values = top_k(sims, k)
+    merged = np.take_along_axis(indices, np.maximum(local, 0), axis=1)
+    empty = local < 0
+    merged[empty] = -1
+    values[empty] = -np.inf
+    return merged, values
+
+
+def _merge_candidates(indices, similarities, rows, cand_cols, cand_sims):
+    """Merge candidate columns into the stored lists of `rows` in place"""
+    if len(rows) == 0 or len(cand_cols) == 0:
+        return
+    stored_idx = indices[rows]
+    stored_sim = np.where(stored_idx >= 0, similarities[rows], -np.inf).astype(np.float32)
+    cand_idx = np.broadcast_to(cand_cols.astype(np.int32), cand_sims.shape)
+    merged_idx, merged_sim = merge_top_k(stored_idx, stored_sim, cand_idx, cand_sims, indices.shape[1])
+    indices[rows] = merged_idx
+    similarities[rows] = np.where(merged_idx >= 0, merged_sim, 0.0)
+
+
+def update_neighbor_table(table, Xn, languages, rows):
+    """
+    Refresh a table after the songs in `rows` changed or were appended.
+
+    `Xn` and `languages` describe the whole updated catalog (appended songs
+    at the end). Songs whose lists mention a changed song are recomputed
+    exactly; every other song only compares itself with the changed rows.
+    Cost is O(changed x catalog) instead of O(catalog^2).
+    """
+    n_songs, n_old = len(Xn), len(table["indices"])
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    labels = language_labels(languages)
+
+    def grown(values, fill):
+        out = np.full((n_songs, values.shape[1]), fill, dtype=values.dtype)
+        out[:n_old] = values
+        return out
+
+    indices = grown(table["indices"], -1)
+    similarities = grown(table["similarities"], 0.0)
+    language_tables = {
+        language: {"indices": grown(t["indices"], -1), "similarities": grown(t["similarities"], 0.0)}
+        for language, t in table["languages"].items()
+    }
+    language_cols = {language: np.flatnonzero(labels == language).astype(np.int32) for language in np.unique(labels)}
+    new_languages = [language for language in language_cols if language not in language_tables]
+    for language in new_languages:
+        language_tables[language] = _empty_table(n_songs, table["language_k"])
+    for language in [l for l in language_tables if l not in language_cols]:
+        # Every song of this language moved elsewhere
+        language_tables[language] = _empty_table(n_songs, table["language_k"])
+
+    # Lists that mention a changed song may now be wrong anywhere, not just at that entry
+    stale = np.zeros(n_songs, dtype=bool)
+    stale[rows] = True
+    changed_old = rows[rows < n_old]
+    if len(changed_old):
+        for stored in [indices] + [t["indices"] for t in language_tables.values()]:
+            stale |= np.isin(stored, changed_old).any(axis=1)
+    stale_rows = np.flatnonzero(stale)
+    fresh_rows = np.flatnonzero(~stale)
+
+    _fill_rows_exact(Xn, stale_rows, indices, similarities, language_cols, language_tables)
+
+    block = max(1, MAX_BLOCK_ELEMENTS // max(len(rows), 1))
+    for start in range(0, len(fresh_rows), block):
+        block_rows = fresh_rows[start:start + block]
+        sims = Xn[block_rows] @ Xn[rows].T
+        _merge_candidates(indices, similarities, block_rows, rows, sims)
+        for language, table_l in language_tables.items():
+            if language in new_languages:
+                continue
+            in_language = labels[rows] == language
+            _merge_candidates(
+                table_l["indices"], table_l["similarities"], block_rows, rows[in_language], sims[:, in_language]
+            )
+
+    # A language seen for the first time has no lists yet: fill them for everyone
+    for language in new_languages:
+        cols = language_cols[language]
+        table_l = language_tables[language]
+        block = max(1, MAX_BLOCK_ELEMENTS // max(len(cols), 1))
+        for start in range(0, len(fresh_rows), block):
+            block_rows = fresh_rows[start:start + block]
+            sims = Xn[block_rows] @ Xn[cols].T
+            sims[cols[np.newaxis, :] == block_rows[:, np.newaxis]] = -np.inf
+            local, values = top_k(sims, table["language_k"])
+            table_l["indices"][block_rows] = np.where(local >= 0, cols[np.maximum(local, 0)], -1)
+            table_l["similarities"][block_rows] = values
+
+    return _table(table["k"], indices, similarities, table["language_k"], language_tables)
+
+
+def lookup_neighbors(table, row, n, language=None):
+    """
+    Up to n (index, similarity) pairs for a song row, or None if the table
+    cannot answer (language unknown to the table or n larger than stored K).
+    """
+    if n < 1:
+        return []
+    if language is None:
+        if n > table["k"]:
+            return None
+        indices, sims = table["indices"][row], table["similarities"][row]
+    else:
+        language_table = table["languages"].get(language)
+        if language_table is None or n > table["language_k"]:
+            return None
+        indices, sims = language_table["indices"][row], language_table["similarities"][row]
+
+    valid = indices[:n] >= 0
+    return list(zip(indices[:n][valid].tolist(), sims[:n][valid].tolist()))
@@ -1,33 +1,50 @@
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
 import joblib
 import os
-from pymongo import MongoClient
 import sys
 import json
+import threading
+import time
+from datetime import datetime, timezone
+from bson import ObjectId
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from title_index import build_title_index, lookup_titles, update_title_index
+from neighbor_table import build_neighbor_table, lookup_neighbors, normalize_rows, top_k, update_neighbor_table
+from ann import INDEX_TYPES, build_index
+from model_store import CategoricalColumn, StringColumn, current_version_file, load_model, save_model
+
+# Modules shared with backend/script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from mongo_indexes import prepare_database
+from music_db import get_client, ping
 
 # -------------------------------------------------------------------
 # 📂 Base paths
 # -------------------------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "models", "song_recommender.joblib")
+# Columnar artifact (model_store.py). Not in git: versions are machine-local, built with
+#   python recommend.py --convert    from the shipped models/song_recommender.joblib
+#   python recommend.py --train      from MongoDB
+MODEL_DIR = os.path.join(BASE_DIR, "models", "song_recommender")
+# Pickled format used before the columnar artifact; kept in git as the shipped model (see convert_legacy_model)
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, "models", "song_recommender.joblib")
+
+# Resident server settings (used by `python recommend.py --serve`)
+SERVER_HOST = os.environ.get("RECOMMENDER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("RECOMMENDER_PORT", "5001"))
 
 # -------------------------------------------------------------------
 # 🔧 MongoDB Connection (Compass / Local)
 # -------------------------------------------------------------------
 def get_mongo_connection():
-    """Connect to MongoDB Compass (local MongoDB server)"""
+    """The shared pooled client for the local MongoDB server (MONGO_URI, see music_db.py)"""
     try:
-        # Local MongoDB Compass connection URI
-        MONGO_URI = "mongodb://localhost:27017"
-
-        # Connect to the local MongoDB instance
-        client = MongoClient(MONGO_URI)
-        client.admin.command("ping")
+        ping()
         print("✅ Connected to MongoDB Compass successfully!")
-        return client
+        return get_client()
     except Exception as e:
         print(f"❌ MongoDB Compass connection failed: {e}")
         return None
@@ -35,8 +52,43 @@ def get_mongo_connection():
 # -------------------------------------------------------------------
 # 🧩 Load Songs from MongoDB
 # -------------------------------------------------------------------
-def load_songs_from_mongodb(db_name="musicDB", collection_name="songs"):
-    """Load songs data from MongoDB collection"""
+FEATURES = [
+    "tempo", "energy", "danceability", "acousticness",
+    "instrumentalness", "liveness", "valence", "beats", "rmse"
+]
+
+# Only these columns are kept for serving; everything else stays in MongoDB
+METADATA_COLUMNS = ["_id", "title", "filename", "language"]
+
+# Documents per cursor round trip / per array fill
+LOAD_BATCH_SIZE = int(os.environ.get("RECOMMENDER_LOAD_BATCH_SIZE", "5000"))
+
+# Timestamp field that writers set on insert/update; drives `--update`
+UPDATED_FIELD = os.environ.get("RECOMMENDER_UPDATED_FIELD", "updated_at")
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _peak_memory_mb():
+    """Peak resident memory of this process, if the platform reports it"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def load_songs_from_mongodb(db_name="musicDB", collection_name="songs", batch_size=LOAD_BATCH_SIZE, query=None):
+    """
+    Stream songs from MongoDB into a DataFrame with only the feature and
+    metadata columns. Features are written chunk by chunk into preallocated
+    float32 arrays instead of building the whole result as Python dicts first.
+    `query` restricts the load (e.g. to songs changed since the last build).
+    """
     client = get_mongo_connection()
     if not client:
         raise Exception("Could not connect to MongoDB")
@@ -45,137 +97,722 @@ def load_songs_from_mongodb(db_name="musicDB", collection_name="songs"):
         # Use your local database name (change if needed)
         db = client[db_name]
         collection = db[collection_name]
+        # Incremental loads filter on UPDATED_FIELD, indexed by the services at startup
+        # or `python mongo_indexes.py` (not here: this loader runs on every train / --update)
+
+        start = time.perf_counter()
+        # A filtered load is usually small: start at one batch and grow
+        capacity = batch_size if query else max(collection.estimated_document_count(), batch_size)
+        features = {f: np.full(capacity, np.nan, dtype=np.float32) for f in FEATURES}
+        metadata = {c: [] for c in METADATA_COLUMNS}
+        seen_features = set()
+
+        projection = {f: 1 for f in FEATURES + METADATA_COLUMNS}
+        cursor = collection.find(query or {}, projection).batch_size(batch_size)
+
+        n_rows = 0
+        chunk = []
+        for doc in cursor:
+            chunk.append(doc)
+            if len(chunk) < batch_size:
+                continue
+            n_rows, capacity = _fill_chunk(chunk, n_rows, capacity, features, metadata, seen_features)
+            chunk = []
+        if chunk:
+            n_rows, capacity = _fill_chunk(chunk, n_rows, capacity, features, metadata, seen_features)
 
-        cursor = collection.find({})
-        songs_df = pd.DataFrame(list(cursor))
-
-        if songs_df.empty:
+        if n_rows == 0:
             print("⚠️ No songs found in MongoDB collection.")
-        else:
-            print(f"✅ Loaded {len(songs_df)} songs from MongoDB")
+            return pd.DataFrame()
+
+        # Features never present in any document are dropped, as before
+        columns = {c: metadata[c] for c in METADATA_COLUMNS}
+        columns.update({f: features[f][:n_rows] for f in FEATURES if f in seen_features})
+        songs_df = pd.DataFrame(columns)
 
-        if "_id" in songs_df.columns:
-            songs_df["_id"] = songs_df["_id"].astype(str)
+        elapsed = time.perf_counter() - start
+        peak = _peak_memory_mb()
+        print(f"✅ Loaded {n_rows} songs from MongoDB")
+        print(f"⏱️ {n_rows / max(elapsed, 1e-9):,.0f} rows/s ({elapsed:.2f}s)"
+              + (f", peak RSS {peak:.0f} MB" if peak is not None else ""))
 
         return songs_df
 
     except Exception as e:
         print(f"❌ Error loading data from MongoDB: {e}")
         return None
-    finally:
-        client.close()
+
+def _fill_chunk(chunk, n_rows, capacity, features, metadata, seen_features):
+    """Copy one batch of documents into the column arrays, growing them if needed"""
+    end = n_rows + len(chunk)
+    if end > capacity:
+        # Count estimates can be stale; grow geometrically
+        capacity = max(end, capacity * 2)
+        for f, values in features.items():
+            grown = np.full(capacity, np.nan, dtype=np.float32)
+            grown[:n_rows] = values[:n_rows]
+            features[f] = grown
+
+    for f, values in features.items():
+        values[n_rows:end] = [_to_float(doc.get(f)) for doc in chunk]
+        if f not in seen_features and any(f in doc for doc in chunk):
+            seen_features.add(f)
+
+    metadata["_id"].extend(str(doc.get("_id", "")) for doc in chunk)
+    for c in METADATA_COLUMNS[1:]:
+        metadata[c].extend(doc.get(c, "") for doc in chunk)
+
+    return end, capacity
 
 # -------------------------------------------------------------------
 # 💾 Train Recommendation Model
 # -------------------------------------------------------------------
-def train_recommendation_model(use_mongodb=True):
+def _new_version():
+    return time.strftime("%Y%m%d%H%M%S") + f"{time.time_ns() // 1000 % 1000000:06d}"
+
+def build_model_package(songs_df, data_source, index_type="brute", watermark=None, **ann_params):
+    """
+    Fit the scaler and build every serving structure from a songs DataFrame.
+
+    index_type picks the nearest-neighbor engine ("brute" exact search or
+    "ivf" approximate search, tuned with n_lists/nprobe). IVF only pays off
+    from roughly 50-100k songs; below that brute is faster (see bench_ann.py).
+    watermark is the time the songs were read; `--update` starts from there.
+    """
+    features = [f for f in FEATURES if f in songs_df.columns]
+    missing_features = [f for f in FEATURES if f not in songs_df.columns]
+    if missing_features:
+        print(f"⚠️ Missing features: {missing_features}")
+
+    print(f"🔧 Using features: {features}")
+    X = songs_df[features].fillna(songs_df[features].mean()).to_numpy(dtype=np.float32)
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    languages = songs_df["language"].tolist() if "language" in songs_df.columns else None
+    X_normalized = normalize_rows(X_scaled)
+    ann_index = build_index(X_normalized, index_type, **ann_params)
+    print(f"🛰️ Neighbor engine: {index_type}")
+
+    metadata = {}
+    for column in METADATA_COLUMNS:
+        values = songs_df[column].tolist() if column in songs_df.columns else [""] * len(songs_df)
+        if column == "language":
+            metadata[column] = CategoricalColumn.from_values(values)
+        else:
+            metadata[column] = StringColumn.from_values(values)
+
+    return {
+        "version": _new_version(),
+        "features": features,
+        "data_source": data_source,
+        "scaler_mean": scaler.mean_,
+        "scaler_scale": scaler.scale_,
+        "extra": {
+            "watermark": watermark.isoformat() if watermark else None,
+            "scaler_stats": _scaler_stats(X.astype(np.float64)),
+        },
+        "X": X,
+        "X_normalized": X_normalized,
+        "ann_index": ann_index,
+        # Every query's answer, computed once: serving becomes an array lookup
+        "neighbor_table": build_neighbor_table(X_scaled, languages=languages, index=ann_index),
+        "title_index": build_title_index(songs_df["title"].tolist()) if "title" in songs_df.columns else None,
+        "metadata": metadata,
+    }
+
+def train_recommendation_model(use_mongodb=True, index_type="brute", **ann_params):
     """Train song recommendation model using MongoDB or CSV data"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: '{index_type}'. Use one of {INDEX_TYPES}")
 
+    watermark = None
     if use_mongodb:
+        # Taken before reading, so songs written during the load are picked up by the next --update
+        watermark = datetime.now(timezone.utc)
         songs_df = load_songs_from_mongodb()
         if songs_df is None or songs_df.empty:
             print("❌ MongoDB empty or failed, using CSV fallback.")
             songs_df = pd.read_csv("musicDB.audio2.csv")
+            watermark = None
     else:
         songs_df = pd.read_csv("musicDB.audio2.csv")
 
-    features = [
-        "tempo", "energy", "danceability", "acousticness",
-        "instrumentalness", "liveness", "valence", "beats", "rmse"
-    ]
-
-    missing_features = [f for f in features if f not in songs_df.columns]
-    if missing_features:
-        print(f"⚠️ Missing features: {missing_features}")
-        features = [f for f in features if f in songs_df.columns]
-
-    print(f"🔧 Using features: {features}")
-    X = songs_df[features].fillna(songs_df[features].mean())
+    model_package = build_model_package(
+        songs_df, "mongodb" if use_mongodb else "csv", index_type, watermark=watermark, **ann_params
+    )
+    # Writes a new version directory and then swaps CURRENT, so running servers never see a partial model
+    save_model(MODEL_DIR, model_package)
 
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    print("✅ Model trained and saved successfully!")
+    print(f"📊 Dataset size: {len(songs_df)} songs")
+    print(f"🎯 Features used: {model_package['features']}")
+    print(f"💾 Source: {'MongoDB' if use_mongodb else 'CSV'}")
 
-    nn = NearestNeighbors(n_neighbors=min(11, len(songs_df)), metric="cosine")
-    nn.fit(X_scaled)
+def convert_legacy_model(joblib_path=LEGACY_MODEL_PATH):
+    """Rebuild a pickled song_recommender.joblib package in the columnar format"""
+    legacy = joblib.load(joblib_path)
+    model_package = build_model_package(legacy["songs_df"], legacy.get("data_source", "mongodb"))
+    save_model(MODEL_DIR, model_package)
+    print(f"✅ Converted {joblib_path} -> {MODEL_DIR} (version {model_package['version']})")
 
-    model_package = {
-        "scaler": scaler,
-        "nn": nn,
-        "songs_df": songs_df,
+# -------------------------------------------------------------------
+# 🔁 Incremental Update
+# -------------------------------------------------------------------
+# `--update` folds songs inserted or changed since the last build into a new
+# version without refitting over the whole catalog:
+#   * changed songs: documents with UPDATED_FIELD or an ObjectId newer than
+#     the stored watermark
+#   * scaler: running count/mean/M2 per feature, old values of changed songs
+#     removed and new values added; vectors keep the stored transform unless
+#     the statistics drifted more than MAX_SCALER_DRIFT (then full rebuild)
+#   * neighbor table, ANN lists and title index: patched for the changed rows
+# Deleted songs are not detected; run --train after removing songs.
+
+# Largest relative change of any feature's mean or std before re-scaling everything
+MAX_SCALER_DRIFT = float(os.environ.get("RECOMMENDER_MAX_SCALER_DRIFT", "0.05"))
+
+def _scaler_stats(X):
+    """Per-feature count, mean and sum of squared deviations (Chan et al. mergeable form)"""
+    mean = X.mean(axis=0) if len(X) else np.zeros(X.shape[1])
+    return {"count": int(len(X)), "mean": mean.tolist(), "m2": ((X - mean) ** 2).sum(axis=0).tolist()}
+
+def _stats_arrays(stats):
+    return stats["count"], np.array(stats["mean"], dtype=np.float64), np.array(stats["m2"], dtype=np.float64)
+
+def _stats_add(stats, X):
+    n_a, mean_a, m2_a = _stats_arrays(stats)
+    n_b, mean_b, m2_b = _stats_arrays(_scaler_stats(X))
+    n = n_a + n_b
+    if n_b == 0:
+        return stats
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+    return {"count": n, "mean": mean.tolist(), "m2": m2.tolist()}
+
+def _stats_remove(stats, X):
+    n, mean, m2 = _stats_arrays(stats)
+    n_b, mean_b, m2_b = _stats_arrays(_scaler_stats(X))
+    n_a = n - n_b
+    if n_b == 0:
+        return stats
+    if n_a <= 0:
+        return _scaler_stats(np.zeros((0, len(mean))))
+    mean_a = (n * mean - n_b * mean_b) / n_a
+    delta = mean_b - mean_a
+    m2_a = np.maximum(m2 - m2_b - delta ** 2 * n_a * n_b / n, 0.0)
+    return {"count": n_a, "mean": mean_a.tolist(), "m2": m2_a.tolist()}
+
+def _stats_scale(stats):
+    """Standard deviation as StandardScaler reports it (population std, 0 -> 1)"""
+    n, _, m2 = _stats_arrays(stats)
+    scale = np.sqrt(m2 / max(n, 1))
+    scale[scale == 0] = 1.0
+    return scale
+
+def _changed_since_query(since):
+    """Songs updated after `since`, or inserted after it (ObjectIds carry their creation time)"""
+    return {"$or": [
+        {UPDATED_FIELD: {"$gt": since}},
+        {"_id": {"$gte": ObjectId.from_datetime(since)}},
+    ]}
+
+def apply_song_updates(model_package, changed_df, watermark=None):
+    """
+    Return a new package with the songs in `changed_df` updated in place
+    (matched by _id) or appended. Cost grows with the number of changed
+    songs times the catalog, not with the catalog squared.
+    """
+    features = model_package["features"]
+    metadata = model_package["metadata"]
+    changed_df = changed_df.drop_duplicates(subset="_id", keep="last")
+
+    ids = metadata["_id"].to_list()
+    row_of = {song_id: row for row, song_id in enumerate(ids)}
+    n_old = len(ids)
+
+    rows, appended = [], 0
+    for song_id in changed_df["_id"]:
+        if song_id in row_of:
+            rows.append(row_of[song_id])
+        else:
+            rows.append(n_old + appended)
+            appended += 1
+    rows = np.array(rows, dtype=np.int64)
+    updated = rows < n_old
+
+    mean = model_package["scaler_mean"]
+    values = changed_df.reindex(columns=features).to_numpy(dtype=np.float32)
+    values = np.where(np.isnan(values), mean.astype(np.float32), values)
+
+    # Copies out of the memory-mapped version; the live version stays untouched
+    X = np.vstack([np.asarray(model_package["X"]), np.zeros((appended, len(features)), dtype=np.float32)])
+    stats = _stats_remove(model_package["extra"]["scaler_stats"], X[rows[updated]].astype(np.float64))
+    X[rows] = values
+    stats = _stats_add(stats, values.astype(np.float64))
+
+    columns = {}
+    for column in METADATA_COLUMNS:
+        current = metadata[column].to_list() + [""] * appended
+        if column in changed_df.columns:
+            for row, value in zip(rows.tolist(), changed_df[column].tolist()):
+                current[row] = value
+        columns[column] = current
+
+    _, new_mean, _ = _stats_arrays(stats)
+    new_scale = _stats_scale(stats)
+    scale = model_package["scaler_scale"]
+    drift = max(
+        float(np.max(np.abs(new_mean - mean) / scale)),
+        float(np.max(np.abs(new_scale / scale - 1.0))),
+    )
+    ann_index = model_package["ann_index"]
+
+    if drift > MAX_SCALER_DRIFT:
+        print(f"⚠️ Feature statistics moved by {drift:.1%} (> {MAX_SCALER_DRIFT:.0%}), rebuilding everything")
+        songs_df = pd.DataFrame({**columns, **{f: X[:, i] for i, f in enumerate(features)}})
+        index_type = ann_index.index_type if ann_index is not None else "brute"
+        ann_params = {"nprobe": ann_index.nprobe} if index_type == "ivf" else {}
+        return build_model_package(songs_df, model_package["data_source"], index_type, watermark=watermark, **ann_params)
+
+    X_normalized = np.vstack([
+        np.asarray(model_package["X_normalized"]), np.zeros((appended, len(features)), dtype=np.float32)
+    ])
+    X_normalized[rows] = normalize_rows((values - mean) / scale)
+
+    table = model_package["neighbor_table"]
+    if table is not None:
+        table = update_neighbor_table(table, X_normalized, columns["language"], rows)
+    title_index = model_package["title_index"]
+    if title_index is not None:
+        title_index = update_title_index(title_index, columns["title"], rows)
+
+    return {
+        "version": _new_version(),
         "features": features,
-        "data_source": "mongodb" if use_mongodb else "csv"
+        "data_source": model_package["data_source"],
+        # The vectors were scaled with these; the running stats only decide when to rescale
+        "scaler_mean": mean,
+        "scaler_scale": scale,
+        "extra": {
+            "watermark": watermark.isoformat() if watermark else model_package["extra"].get("watermark"),
+            "scaler_stats": stats,
+        },
+        "X": X,
+        "X_normalized": X_normalized,
+        "ann_index": ann_index.updated(X_normalized, rows) if ann_index is not None else None,
+        "neighbor_table": table,
+        "title_index": title_index,
+        "metadata": {
+            column: CategoricalColumn.from_values(values) if column == "language" else StringColumn.from_values(values)
+            for column, values in columns.items()
+        },
     }
 
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump(model_package, MODEL_PATH)
+def update_recommendation_model():
+    """Fold songs added or changed in MongoDB since the last build into a new version"""
+    if not model_exists():
+        print("⚠️ No model yet, running a full training instead.")
+        return train_recommendation_model(use_mongodb=True)
+
+    model_package = get_model_package()
+    watermark = model_package["extra"].get("watermark")
+    if not watermark or "scaler_stats" not in model_package["extra"]:
+        print("⚠️ Model has no update watermark (CSV or converted build), running a full training instead.")
+        return train_recommendation_model(use_mongodb=True)
+
+    start = time.perf_counter()
+    since = datetime.fromisoformat(watermark)
+    new_watermark = datetime.now(timezone.utc)
+    changed_df = load_songs_from_mongodb(query=_changed_since_query(since))
+    if changed_df is None:
+        print("❌ Could not read changed songs, model left as is.")
+        return
+    if changed_df.empty:
+        print(f"✅ No new or changed songs since {watermark}")
+        return
+
+    new_package = apply_song_updates(model_package, changed_df, watermark=new_watermark)
+    save_model(MODEL_DIR, new_package)
+
+    print(f"✅ Applied {len(changed_df)} new/changed songs in {time.perf_counter() - start:.2f}s")
+    print(f"📊 Dataset size: {len(new_package['X'])} songs (version {new_package['version']})")
 
-    print("✅ Model trained and saved successfully!")
-    print(f"📊 Dataset size: {len(songs_df)} songs")
-    print(f"🎯 Features used: {features}")
-    print(f"💾 Source: {'MongoDB' if use_mongodb else 'CSV'}")
+# -------------------------------------------------------------------
+# 📦 Model Loading
+# -------------------------------------------------------------------
+# (stamp, package) is swapped as one reference, so readers never see a half-updated model
+_model_entry = (None, None)
+_model_lock = threading.Lock()
+
+def _artifact_stamp(stat_result):
+    """Cheap version stamp for the CURRENT pointer (changes whenever training writes a version)"""
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+def model_exists():
+    return os.path.exists(current_version_file(MODEL_DIR))
+
+def get_model_package():
+    """Return the cached model package, reloading it only when a new version was written"""
+    global _model_entry
+    stamp = _artifact_stamp(os.stat(current_version_file(MODEL_DIR)))
+    cached_stamp, package = _model_entry
+    if cached_stamp == stamp:
+        return package
+
+    with _model_lock:
+        cached_stamp, package = _model_entry
+        if cached_stamp == stamp:
+            return package
+
+        # Stamp the pointer we actually read, not the path, in case it is replaced meanwhile
+        with open(current_version_file(MODEL_DIR), encoding="utf-8") as f:
+            loaded_stamp = _artifact_stamp(os.fstat(f.fileno()))
+            version_name = f.read().strip()
+
+        # Arrays are memory-mapped: this is a handful of file opens, not a full read
+        package = load_model(MODEL_DIR, version_name)
+
+        if cached_stamp is not None:
+            print(f"🔄 Reloaded model (version {package['version']})", file=sys.stderr)
+        _model_entry = (loaded_stamp, package)
+        return package
+
+def _model_missing_error():
+    return {"error": f"Model not found at {MODEL_DIR}. Build it with 'recommend.py --convert' or '--train'."}
+
+def _song_summary(metadata, i):
+    return {
+        "title": metadata["title"][i],
+        "filename": metadata["filename"][i],
+        "language": metadata["language"][i]
+    }
 
 # -------------------------------------------------------------------
 # 🎧 Recommend Songs
 # -------------------------------------------------------------------
-def recommend_songs(song_title, n_recommendations=5):
-    """Recommend similar songs based on title"""
+def recommend_songs(song_title, n_recommendations=5, language=None):
+    """Recommend similar songs based on title, optionally only songs in one language"""
     try:
-        if not os.path.exists(MODEL_PATH):
-            return {"error": f"Model not found at {MODEL_PATH}. Please train it first."}
+        if not model_exists():
+            return _model_missing_error()
 
-        model_package = joblib.load(MODEL_PATH)
-        scaler = model_package["scaler"]
-        nn = model_package["nn"]
-        songs_df = model_package["songs_df"]
-        features = model_package["features"]
+        model_package = get_model_package()
+        metadata = model_package["metadata"]
 
-        if "title" not in songs_df.columns:
+        if model_package["title_index"] is None:
             return {"error": "The dataset has no 'title' column."}
 
-        mask = songs_df["title"].str.contains(song_title, case=False, na=False)
-        matches = songs_df[mask]
-        if matches.empty:
+        matches = lookup_titles(model_package["title_index"], song_title, limit=1)
+        if not matches:
             return {"error": f"No song found with title: '{song_title}'"}
 
-        song_idx = matches.index[0]
-        song_features = songs_df.loc[song_idx, features].values.reshape(1, -1)
-        song_features_df = pd.DataFrame(song_features, columns=features)
-        song_scaled = scaler.transform(song_features_df)
-
-        distances, indices = nn.kneighbors(song_scaled, n_neighbors=n_recommendations + 5)
-        similar_indices = indices[0]
-        similar_distances = distances[0]
+        song_pos = matches[0][0]
+        base_song = _song_summary(metadata, song_pos)
 
-        base_song = {
-            "title": songs_df.loc[song_idx, "title"],
-            "filename": songs_df.loc[song_idx, "filename"],
-            "language": songs_df.loc[song_idx, "language"]
-        }
+        neighbors = None
+        if model_package["neighbor_table"] is not None:
+            neighbors = lookup_neighbors(model_package["neighbor_table"], song_pos, n_recommendations, language)
+        if neighbors is None:
+            # More neighbors than the table stores: search the catalog directly
+            indices, values = _search_neighbors(model_package, np.array([song_pos]), n_recommendations, language)
+            neighbors = [(i, s) for i, s in zip(indices[0].tolist(), values[0].tolist()) if i >= 0]
 
         recs = []
-        for i, d in zip(similar_indices, similar_distances):
-            if i == song_idx:
-                continue
-            song = songs_df.iloc[i]
-            recs.append({
-                "title": song["title"],
-                "filename": song["filename"],
-                "language": song.get("language", ""),
-                "similarity": float(1 - d)
+        for i, similarity in neighbors:
+            recs.append({**_song_summary(metadata, i), "similarity": float(similarity)})
+
+        return {"searched_song": base_song, "recommendations": recs}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+def _language_rows(model_package, language):
+    if language is None:
+        return None
+    return model_package["metadata"]["language"].rows_equal(language)
+
+def _search_neighbors(model_package, seeds, n_recommendations, language=None):
+    """Cosine top-n for seed rows, all seeds in one engine query or one matrix product"""
+    Xn = model_package["X_normalized"]
+    cols = _language_rows(model_package, language)
+    if cols is None:
+        if model_package["ann_index"] is not None:
+            return model_package["ann_index"].search(Xn[seeds], n_recommendations, exclude=seeds)
+        cols = np.arange(len(Xn))
+    if len(cols) == 0:
+        empty = np.full((len(seeds), n_recommendations), -1, dtype=np.int32)
+        return empty, np.zeros(empty.shape, dtype=np.float32)
+
+    sims = Xn[seeds] @ Xn[cols].T
+    sims[cols[np.newaxis, :] == seeds[:, np.newaxis]] = -np.inf
+    local, values = top_k(sims, n_recommendations)
+    return np.where(local >= 0, cols[np.maximum(local, 0)], -1), values
+
+# -------------------------------------------------------------------
+# 🎶 Batch / Playlist Recommendations
+# -------------------------------------------------------------------
+def recommend_batch(song_titles, n_recommendations=5, mode="per_seed", language=None):
+    """
+    Recommend for many seed titles in one pass.
+
+    mode="per_seed": one recommendation list per seed (same as calling
+    recommend_songs for each title, but with a single table lookup or
+    matrix product for all seeds).
+    mode="playlist": one list of songs closest to the centroid of all
+    seeds, excluding the seeds and without repeating a song.
+    """
+    try:
+        if mode not in ("per_seed", "playlist"):
+            return {"error": f"Unknown mode: '{mode}'. Use 'per_seed' or 'playlist'."}
+
+        if not model_exists():
+            return _model_missing_error()
+
+        model_package = get_model_package()
+        metadata = model_package["metadata"]
+        Xn = model_package["X_normalized"]
+
+        if model_package["title_index"] is None:
+            return {"error": "The dataset has no 'title' column."}
+
+        seed_rows, not_found = [], []
+        for title in song_titles:
+            matches = lookup_titles(model_package["title_index"], title, limit=1)
+            if matches:
+                seed_rows.append(matches[0][0])
+            else:
+                not_found.append(title)
+
+        if not seed_rows:
+            return {"error": "None of the seed songs were found", "not_found": not_found}
+
+        seeds = np.array(seed_rows, dtype=np.int64)
+
+        if mode == "playlist":
+            centroid = normalize_rows(Xn[seeds].mean(axis=0, keepdims=True))
+            # Extra candidates so seeds (and rows repeating a seed's _id) can be skipped
+            n_candidates = n_recommendations + len(seeds) + 5
+            language_cols = _language_rows(model_package, language)
+            if language_cols is None and model_package["ann_index"] is not None:
+                indices, values = model_package["ann_index"].search(centroid, n_candidates)
+            else:
+                sims = (Xn @ centroid.T).ravel()
+                if language_cols is not None:
+                    mask = np.full(len(sims), -np.inf, dtype=np.float32)
+                    mask[language_cols] = 0.0
+                    sims = sims + mask
+                indices, values = top_k(sims[np.newaxis, :], n_candidates)
+
+            seed_set = set(seed_rows)
+            # Keyed on _id, not filename: songs without a filename must not collapse into one
+            recs, seen_ids = [], {metadata["_id"][i] for i in seed_rows}
+            for i, similarity in zip(indices[0].tolist(), values[0].tolist()):
+                if i < 0:
+                    break
+                if i in seed_set or metadata["_id"][i] in seen_ids:
+                    continue
+                seen_ids.add(metadata["_id"][i])
+                recs.append({**_song_summary(metadata, i), "similarity": float(similarity)})
+                if len(recs) == n_recommendations:
+                    break
+
+            return {
+                "mode": mode,
+                "seed_songs": [_song_summary(metadata, i) for i in seed_rows],
+                "recommendations": recs,
+                "not_found": not_found
+            }
+
+        table = model_package["neighbor_table"]
+        table_k = None
+        if table is not None:
+            table_k = table["k"] if language is None else table["language_k"]
+            if language is not None and language not in table["languages"]:
+                table_k = None
+
+        if table_k is not None and n_recommendations <= table_k:
+            source = table if language is None else table["languages"][language]
+            indices = source["indices"][seeds, :n_recommendations]
+            values = source["similarities"][seeds, :n_recommendations]
+        else:
+            # One matrix product for every seed instead of one query each
+            indices, values = _search_neighbors(model_package, seeds, n_recommendations, language)
+
+        results = []
+        for seed, row_indices, row_values in zip(seed_rows, indices.tolist(), values.tolist()):
+            results.append({
+                "searched_song": _song_summary(metadata, seed),
+                "recommendations": [
+                    {**_song_summary(metadata, i), "similarity": float(similarity)}
+                    for i, similarity in zip(row_indices, row_values) if i >= 0
+                ]
             })
 
-        recs = recs[:n_recommendations]
+        return {"mode": mode, "results": results, "not_found": not_found}
 
-        return {"searched_song": base_song, "recommendations": recs}
+    except Exception as e:
+        return {"error": str(e)}
+
+# -------------------------------------------------------------------
+# 🔎 Title Autocomplete
+# -------------------------------------------------------------------
+def autocomplete_titles(query, limit=10):
+    """Suggest catalog titles for a partial query, best match first"""
+    try:
+        if not model_exists():
+            return _model_missing_error()
+
+        model_package = get_model_package()
+        if model_package["title_index"] is None:
+            return {"error": "The dataset has no 'title' column."}
+
+        suggestions = []
+        for row, score in lookup_titles(model_package["title_index"], query, limit=limit):
+            suggestions.append({**_song_summary(model_package["metadata"], row), "score": round(float(score), 3)})
+
+        return {"query": query, "suggestions": suggestions}
 
     except Exception as e:
         return {"error": str(e)}
 
+# -------------------------------------------------------------------
+# 🌐 Resident Server Mode
+# -------------------------------------------------------------------
+class RecommendRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /recommend?song=<title>&n=<count>[&language=<lang>]
+    GET  /autocomplete?q=<text>
+    POST /recommend/batch  {"songs": [...], "n": 5, "mode": "per_seed" | "playlist"}
+    """
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query, keep_blank_values=True)  # so "language=" is rejected, not ignored
+
+        if url.path == "/health":
+            return self._send_json(200, {"status": "ok", "model_loaded": _model_entry[1] is not None})
+
+        if url.path == "/autocomplete":
+            try:
+                limit = int(params.get("limit", ["10"])[0])
+            except ValueError:
+                return self._send_json(400, {"error": "'limit' must be an integer"})
+            return self._send_json(200, autocomplete_titles(params.get("q", [""])[0], limit=limit))
+
+        if url.path != "/recommend":
+            return self._send_json(404, {"error": f"Unknown path: {url.path}"})
+
+        song_title = params.get("song", [""])[0]
+        if not song_title:
+            return self._send_json(400, {"error": "Missing 'song' query parameter"})
+
+        try:
+            n_recommendations = int(params.get("n", ["5"])[0])
+        except ValueError:
+            return self._send_json(400, {"error": "'n' must be an integer"})
+
+        if n_recommendations < 1:
+            return self._send_json(400, {"error": "'n' must be at least 1"})
+
+        language = params.get("language", [None])[0]
+        if language is not None and not language:
+            return self._send_json(400, {"error": "'language' must be a non-empty string"})
+        self._send_json(200, recommend_songs(song_title, n_recommendations=n_recommendations, language=language))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/recommend/batch":
+            return self._send_json(404, {"error": f"Unknown path: {url.path}"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            return self._send_json(400, {"error": "Body must be JSON"})
+        if not isinstance(body, dict):
+            return self._send_json(400, {"error": "Body must be a JSON object"})
+
+        songs = body.get("songs")
+        if not isinstance(songs, list) or not songs:
+            return self._send_json(400, {"error": "'songs' must be a non-empty list of titles"})
+
+        try:
+            n_recommendations = int(body.get("n", 5))
+        except (TypeError, ValueError):
+            return self._send_json(400, {"error": "'n' must be an integer"})
+        if n_recommendations < 1:
+            return self._send_json(400, {"error": "'n' must be at least 1"})
+
+        language = body.get("language")
+        if language is not None and (not isinstance(language, str) or not language):
+            return self._send_json(400, {"error": "'language' must be a non-empty string or null"})
+        mode = body.get("mode", "per_seed")
+        if mode not in ("per_seed", "playlist"):
+            return self._send_json(400, {"error": "'mode' must be 'per_seed' or 'playlist'"})
+
+        self._send_json(200, recommend_batch(
+            songs,
+            n_recommendations=n_recommendations,
+            mode=mode,
+            language=language
+        ))
+
+    def log_message(self, format, *args):
+        # Keep stdout quiet; one line per request goes to stderr like http.server does
+        sys.stderr.write(f"🎧 {self.address_string()} {format % args}\n")
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    """Run a long-lived recommender that loads the model once and answers many queries"""
+    if model_exists():
+        package = get_model_package()
+        print(f"✅ Model loaded from {MODEL_DIR} (version {package['version']})")
+    else:
+        print(f"⚠️ Model not found at {MODEL_DIR}, requests will fail until it is built (--convert or --train).")
+
+    client = get_mongo_connection()
+    if client:
+        # Indexes for the hot musicDB queries, then an explain() check (see mongo_indexes.py); not fatal
+        try:
+            prepare_database(client["musicDB"])
+        except Exception as e:
+            print(f"⚠️ Index setup failed, continuing without it: {e}")
+
+    server = ThreadingHTTPServer((host, port), RecommendRequestHandler)
+    server.daemon_threads = True
+    print(f"🌐 Recommender listening on http://{host}:{port}/recommend?song=<title>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 # -------------------------------------------------------------------
 # 🧪 Test Mode
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else SERVER_PORT
+        serve(port=port)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--train":
+        # python recommend.py --train [brute|ivf]
+        train_recommendation_model(use_mongodb=True, index_type=sys.argv[2] if len(sys.argv) > 2 else "brute")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--update":
+        update_recommendation_model()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--convert":
+        convert_legacy_model(sys.argv[2] if len(sys.argv) > 2 else LEGACY_MODEL_PATH)
+    elif len(sys.argv) > 1:
         song_name = sys.argv[1]
         result = recommend_songs(song_name, n_recommendations=5)
         print(json.dumps(result, indent=2))
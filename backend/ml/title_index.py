@@ -0,0 +1,231 @@
+import re
+import unicodedata
+import numpy as np
+
+# -------------------------------------------------------------------
+# 🔤 Title Lookup Index
+# -------------------------------------------------------------------
+# The index is a dict of plain NumPy arrays so it can be stored inside the
+# model package and loaded without any custom classes:
+#   titles                       -> normalized title per row
+#   sorted_titles / sorted_rows  -> exact and whole-title prefix matches
+#   sorted_words  / word_rows    -> prefix matches on any word of the title
+#   gram_keys / gram_offsets / gram_rows -> trigram fuzzy matches
+# All rows are positions in songs_df.
+
+NGRAM = 3
+MAX_PREFIX_CANDIDATES = 1000
+MIN_TRIGRAM_COVERAGE = 0.5
+
+# Match tiers, best first (fuzzy scores are scaled into [0, FUZZY_SCORE])
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+WORD_PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.7
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_title(title):
+    """Lowercase, strip accents and collapse punctuation/underscores to single spaces"""
+    if not isinstance(title, str):
+        return ""
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", title.lower()).strip()
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+def build_title_index(titles):
+    """Build the lookup arrays for a sequence of titles (row i = titles[i])"""
+    normalized = [normalize_title(t) for t in titles]
+    row_titles = np.array(normalized, dtype=str)
+    title_order = np.argsort(row_titles, kind="stable")
+
+    words, word_rows = [], []
+    grams = {}
+    for row, text in enumerate(normalized):
+        for word in set(text.split()):
+            words.append(word)
+            word_rows.append(row)
+        for gram in (_trigrams(text) if text else ()):
+            grams.setdefault(gram, []).append(row)
+
+    words = np.array(words, dtype=str)
+    word_order = np.argsort(words, kind="stable")
+
+    gram_keys = np.array(sorted(grams), dtype=str)
+    gram_offsets = np.zeros(len(gram_keys) + 1, dtype=np.int64)
+    gram_offsets[1:] = np.cumsum([len(grams[g]) for g in gram_keys])
+    gram_rows = np.fromiter(
+        (row for g in gram_keys for row in grams[g]), dtype=np.int32, count=int(gram_offsets[-1])
+    )
+
+    return {
+        "titles": row_titles,
+        "sorted_titles": row_titles[title_order],
+        "sorted_rows": title_order.astype(np.int32),
+        "sorted_words": words[word_order],
+        "word_rows": np.array(word_rows, dtype=np.int32)[word_order],
+        "gram_keys": gram_keys,
+        "gram_offsets": gram_offsets,
+        "gram_rows": gram_rows,
+        "title_lengths": np.array([len(t) for t in normalized], dtype=np.int32),
+    }
+
+
+def _prefix_range(sorted_keys, prefix):
+    lo = np.searchsorted(sorted_keys, prefix, side="left")
+    hi = np.searchsorted(sorted_keys, prefix + "\U0010ffff", side="left")
+    return int(lo), int(min(hi, lo + MAX_PREFIX_CANDIDATES))
+
+
+def _fuzzy_candidates(index, query):
+    query_grams = sorted(_trigrams(query))
+    keys = index["gram_keys"]
+    positions = np.searchsorted(keys, query_grams)
+    offsets = index["gram_offsets"]
+
+    postings = [
+        index["gram_rows"][offsets[p]:offsets[p + 1]]
+        for p, gram in zip(positions, query_grams)
+        if p < len(keys) and keys[p] == gram
+    ]
+    if not postings:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    rows, shared = np.unique(np.concatenate(postings), return_counts=True)
+    # Fraction of the query's trigrams found in the title (typos, partial words)
+    coverage = shared / len(query_grams)
+    keep = coverage >= MIN_TRIGRAM_COVERAGE
+    return rows[keep], (coverage[keep] * FUZZY_SCORE).astype(np.float32)
+
+
+def lookup_titles(index, query, limit=10, fuzzy=True):
+    """
+    Return up to `limit` (row, score) pairs ranked best first:
+    exact title, title prefix, word prefix, then trigram similarity.
+    """
+    query = normalize_title(query)
+    if not query or limit <= 0:
+        return []
+
+    lengths = index["title_lengths"]
+    results = []
+    seen = set()
+
+    def add(rows, score):
+        # Within a tier, prefer the shortest (closest) title
+        for row in sorted(rows.tolist(), key=lambda r: (lengths[r], r)):
+            if row not in seen:
+                seen.add(row)
+                results.append((row, score))
+
+    lo, hi = _prefix_range(index["sorted_titles"], query)
+    exact = index["sorted_titles"][lo:hi] == query
+    add(index["sorted_rows"][lo:hi][exact], EXACT_SCORE)
+    add(index["sorted_rows"][lo:hi][~exact], PREFIX_SCORE)
+
+    if len(results) < limit:
+        first_word = query.split()[0]
+        lo, hi = _prefix_range(index["sorted_words"], first_word)
+        rows = index["word_rows"][lo:hi]
+        if " " in query:
+            # Multi-word query: the word match is only a candidate if the rest follows
+            titles = index["titles"]
+            rows = np.array([r for r in rows if query in titles[r]], dtype=np.int32)
+        add(rows, WORD_PREFIX_SCORE)
+
+    if fuzzy and len(results) < limit:
+        rows, scores = _fuzzy_candidates(index, query)
+        for score in np.unique(scores)[::-1]:
+            add(rows[scores == score], float(score))
+            if len(results) >= limit:
+                break
+
+    return results[:limit]
+
+
+def _insert_sorted(sorted_keys, sorted_rows, drop_rows, new_keys, new_rows):
+    """Remove entries for drop_rows and insert (new_keys, new_rows) keeping the key order"""
+    keep = ~np.isin(sorted_rows, drop_rows)
+    keys, rows = sorted_keys[keep], sorted_rows[keep]
+    new_keys = np.array(new_keys, dtype=str)
+    order = np.argsort(new_keys, kind="stable")
+    new_keys = new_keys[order]
+    new_rows = np.asarray(new_rows, dtype=np.int32)[order]
+    keys = keys.astype(np.result_type(keys.dtype, new_keys.dtype))
+    positions = np.searchsorted(keys, new_keys)
+    return np.insert(keys, positions, new_keys), np.insert(rows, positions, new_rows)
+
+
+def update_title_index(index, titles, rows):
+    """
+    Return a new index after titles[rows] changed or were appended.
+
+    `titles` is the full updated title list. Only the changed rows are
+    normalized and tokenized; the rest is array merging.
+    """
+    rows = np.unique(np.asarray(rows, dtype=np.int32))
+    n_songs, n_old = len(titles), len(index["titles"])
+    normalized = {int(r): normalize_title(titles[r]) for r in rows}
+
+    row_titles = np.concatenate([index["titles"], np.full(n_songs - n_old, "", dtype=index["titles"].dtype)])
+    changed_titles = np.array([normalized[int(r)] for r in rows], dtype=str)
+    row_titles = row_titles.astype(np.result_type(row_titles.dtype, changed_titles.dtype))
+    row_titles[rows] = changed_titles
+
+    sorted_titles, sorted_rows = _insert_sorted(
+        index["sorted_titles"], index["sorted_rows"], rows, changed_titles, rows
+    )
+
+    words, word_rows = [], []
+    gram_pairs = []
+    for r, text in normalized.items():
+        for word in set(text.split()):
+            words.append(word)
+            word_rows.append(r)
+        gram_pairs.extend((gram, r) for gram in (_trigrams(text) if text else ()))
+    sorted_words, sorted_word_rows = _insert_sorted(
+        index["sorted_words"], index["word_rows"], rows, words, word_rows
+    )
+
+    # Trigram postings: drop the changed rows, add their new grams, re-group by gram
+    old_ids = np.repeat(np.arange(len(index["gram_keys"])), np.diff(index["gram_offsets"]))
+    keep = ~np.isin(index["gram_rows"], rows)
+    new_grams = np.array([g for g, _ in gram_pairs], dtype=str)
+    all_keys = np.union1d(index["gram_keys"], new_grams) if len(new_grams) else index["gram_keys"]
+    ids = np.concatenate([
+        np.searchsorted(all_keys, index["gram_keys"])[old_ids[keep]],
+        np.searchsorted(all_keys, new_grams),
+    ])
+    postings = np.concatenate([
+        index["gram_rows"][keep],
+        np.array([r for _, r in gram_pairs], dtype=np.int32),
+    ])
+    order = np.lexsort((postings, ids))
+    ids, postings = ids[order], postings[order]
+
+    counts = np.bincount(ids, minlength=len(all_keys))
+    used = counts > 0
+    gram_offsets = np.zeros(int(used.sum()) + 1, dtype=np.int64)
+    gram_offsets[1:] = np.cumsum(counts[used])
+
+    lengths = np.concatenate([index["title_lengths"], np.zeros(n_songs - n_old, dtype=np.int32)])
+    lengths[rows] = [len(normalized[int(r)]) for r in rows]
+
+    return {
+        "titles": row_titles,
+        "sorted_titles": sorted_titles,
+        "sorted_rows": sorted_rows,
+        "sorted_words": sorted_words,
+        "word_rows": sorted_word_rows,
+        "gram_keys": all_keys[used],
+        "gram_offsets": gram_offsets,
+        "gram_rows": postings.astype(np.int32),
+        "title_lengths": lengths,
+    }
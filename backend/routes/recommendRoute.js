@@ -1,3 +1,4 @@
+import axios from "axios";
 import express from "express";
 import { spawn } from "child_process";
 import path from "path";
@@ -9,48 +10,119 @@ const router = express.Router();
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
-router.get("/", (req, res) => {
-  const songName = req.query.song;
+// ✅ Resident recommender started with `python backend/ml/recommend.py --serve`
+const RECOMMENDER_URL = process.env.RECOMMENDER_URL || "http://127.0.0.1:5001";
 
-  if (!songName) {
-    return res.status(400).json({ error: "Missing 'song' query parameter" });
-  }
+// Fallback: run recommend.py once for this request (slow, loads the model every time)
+const runRecommendScript = (songName) =>
+  new Promise((resolve, reject) => {
+    // ✅ Path to your recommend.py file
+    const scriptPath = path.join(__dirname, "../ml/recommend.py");
 
-  // ✅ Path to your recommend.py file
-  const scriptPath = path.join(__dirname, "../ml/recommend.py");
+    // ✅ Run the Python script with the song name
+    const pythonProcess = spawn("python", [scriptPath, songName]);
 
-  // ✅ Run the Python script with the song name
-  const pythonProcess = spawn("python", [scriptPath, songName]);
+    let dataString = "";
+    let errorString = "";
 
-  let dataString = "";
-  let errorString = "";
+    // ✅ Listen for output
+    pythonProcess.stdout.on("data", (data) => {
+      dataString += data.toString();
+    });
 
-  // ✅ Listen for output
-  pythonProcess.stdout.on("data", (data) => {
-    dataString += data.toString();
-  });
+    // ✅ Listen for errors
+    pythonProcess.stderr.on("data", (data) => {
+      errorString += data.toString();
+    });
+
+    // ✅ When Python script finishes
+    pythonProcess.on("close", () => {
+      if (errorString) {
+        return reject(new Error(errorString));
+      }
 
-  // ✅ Listen for errors
-  pythonProcess.stderr.on("data", (data) => {
-    errorString += data.toString();
+      try {
+        // Parse the JSON returned by Python
+        resolve(JSON.parse(dataString));
+      } catch (e) {
+        console.error("JSON Parse Error:", e.message, dataString);
+        reject(new Error("Failed to parse Python output"));
+      }
+    });
   });
 
-  // ✅ When Python script finishes
-  pythonProcess.on("close", (code) => {
-    if (errorString) {
-      console.error("Python Error:", errorString);
-      return res.status(500).json({ error: errorString });
+// ✅ Title suggestions as the user types (resident recommender only)
+router.get("/autocomplete", async (req, res) => {
+  const query = req.query.q;
+
+  if (!query) {
+    return res.status(400).json({ error: "Missing 'q' query parameter" });
+  }
+
+  try {
+    const { data } = await axios.get(`${RECOMMENDER_URL}/autocomplete`, {
+      params: { q: query, limit: req.query.limit },
+      timeout: 2000,
+    });
+    res.json(data);
+  } catch (err) {
+    if (err.response) {
+      return res.status(err.response.status).json(err.response.data);
+    }
+    console.error("Autocomplete Error:", err.message);
+    res.status(503).json({ error: "Recommender service unavailable" });
+  }
+});
+
+// ✅ Many seeds in one call: { songs: [...], n, mode: "per_seed" | "playlist", language }
+router.post("/batch", async (req, res) => {
+  const { songs } = req.body || {};
+
+  if (!Array.isArray(songs) || songs.length === 0) {
+    return res.status(400).json({ error: "'songs' must be a non-empty array of titles" });
+  }
+
+  try {
+    const { data } = await axios.post(`${RECOMMENDER_URL}/recommend/batch`, req.body, {
+      timeout: 10000,
+    });
+    res.json(data);
+  } catch (err) {
+    if (err.response) {
+      return res.status(err.response.status).json(err.response.data);
     }
+    console.error("Batch Recommend Error:", err.message);
+    res.status(503).json({ error: "Recommender service unavailable" });
+  }
+});
+
+router.get("/", async (req, res) => {
+  const songName = req.query.song;
+
+  if (!songName) {
+    return res.status(400).json({ error: "Missing 'song' query parameter" });
+  }
 
-    try {
-      // Parse the JSON returned by Python
-      const parsed = JSON.parse(dataString);
-      res.json(parsed);
-    } catch (e) {
-      console.error("JSON Parse Error:", e.message, dataString);
-      res.status(500).json({ error: "Failed to parse Python output" });
+  try {
+    // ✅ Ask the resident recommender (model already in memory)
+    const { data } = await axios.get(`${RECOMMENDER_URL}/recommend`, {
+      params: { song: songName, n: req.query.n, language: req.query.language },
+      timeout: 5000,
+    });
+    return res.json(data);
+  } catch (err) {
+    if (err.response) {
+      return res.status(err.response.status).json(err.response.data);
     }
-  });
+    console.warn("⚠️ Resident recommender unavailable, spawning recommend.py:", err.message);
+  }
+
+  try {
+    res.json(await runRecommendScript(songName));
+  } catch (e) {
+    console.error("Python Error:", e.message);
+    res.status(500).json({ error: e.message });
+  }
 });
 
 export default router;
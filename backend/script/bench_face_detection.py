@@ -0,0 +1,95 @@
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+import cv2
+from PIL import Image
+from face_detection import CASCADE_PATH, DNNDetector, HaarDetector, detect_largest_face
+
+# ---------------- Face detection benchmark ----------------
+# Places image/faces samples into photo-sized frames (face about a third of
+# the frame height, random position, noisy background) and reports, per input
+# resolution and detector: median latency and hit rate (a box with IoU >= 0.3
+# against the placed face).
+#
+#   full-res haar   the old extract_face: RGB copy + cascade on the whole photo
+#   haar            downscaled grayscale + min face size (face_detection.py)
+#   dnn             OpenCV res10 SSD, if its model files are present
+#
+#   python backend/script/bench_face_detection.py --resolutions 640x480 1920x1080 4032x3024
+
+FACES_DIR = Path(__file__).resolve().parent.parent.parent / "image" / "faces"
+
+
+def make_frame(face_path, width, height, rng):
+    """Frame of the given size with one face pasted in; returns (PIL image, true box)"""
+    face = Image.open(face_path).convert("RGB")
+    side = height // 3
+    face = face.resize((side, side), Image.BICUBIC)
+    frame = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+    frame = Image.fromarray(cv2.GaussianBlur(frame, (0, 0), 5))
+    x = int(rng.integers(0, width - side))
+    y = int(rng.integers(0, height - side))
+    frame.paste(face, (x, y))
+    return frame, (x, y, side, side)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def full_res_haar(cascade):
+    def detect(pil_image):
+        img = np.array(pil_image.convert("RGB"))
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        faces = cascade.detectMultiScale(gray, 1.3, 5)
+        if len(faces) == 0:
+            return None
+        return tuple(max(faces, key=lambda f: f[2] * f[3]))
+    return detect
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detection latency and hit rate")
+    parser.add_argument("--faces", default=str(FACES_DIR))
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1280x720", "1920x1080", "4032x3024"])
+    parser.add_argument("--samples", type=int, default=60)
+    parser.add_argument("--max-side", type=int, nargs="+", default=[640, 320])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    paths = sorted(Path(args.faces).glob("*/*.jpg"))
+    paths = [paths[i] for i in rng.choice(len(paths), size=min(args.samples, len(paths)), replace=False)]
+
+    detectors = {"full-res haar": full_res_haar(cv2.CascadeClassifier(CASCADE_PATH))}
+    haar = HaarDetector()
+    for max_side in args.max_side:
+        detectors[f"haar/{max_side}"] = lambda img, m=max_side: detect_largest_face(haar, img, m)
+    try:
+        dnn = DNNDetector()
+        for max_side in args.max_side:
+            detectors[f"dnn/{max_side}"] = lambda img, m=max_side: detect_largest_face(dnn, img, m)
+    except FileNotFoundError as e:
+        print(f"⚠️ Skipping dnn: {e}")
+
+    print(f"{'resolution':>11} {'detector':>14} {'median (ms)':>12} {'hit rate':>9}")
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        frames = [make_frame(p, width, height, rng) for p in paths]
+        for name, detect in detectors.items():
+            latencies, hits = [], 0
+            for frame, truth in frames:
+                start = time.perf_counter()
+                box = detect(frame)
+                latencies.append(time.perf_counter() - start)
+                hits += box is not None and iou(box, truth) >= 0.3
+            print(f"{resolution:>11} {name:>14} {np.median(latencies) * 1e3:>12.1f} {hits / len(frames):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
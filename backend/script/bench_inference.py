@@ -0,0 +1,63 @@
+import argparse
+import os
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+from inference_batcher import MicroBatcher
+
+# ---------------- Emotion CNN batching benchmark ----------------
+# Throughput of the emotion CNN under concurrent callers: every thread calling
+# the model with its own face vs. all threads going through MicroBatcher.
+#
+#   python backend/script/bench_inference.py --threads 1 4 16 --requests 400
+#   python backend/script/bench_inference.py --max-batch 32 --max-wait-ms 2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMOTION_MODEL_PATH = os.path.join(BASE_DIR, "models", "emotion_cnn.keras")
+
+
+def run_load(call, n_threads, n_requests):
+    """Faces per second with n_threads callers issuing n_requests in total"""
+    face = np.random.default_rng(0).uniform(-1, 1, size=(1, 224, 224, 3)).astype(np.float32)
+    per_thread = n_requests // n_threads
+
+    def worker():
+        for _ in range(per_thread):
+            call(face)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return per_thread * n_threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched emotion CNN inference")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=320)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(EMOTION_MODEL_PATH)
+
+    def predict(batch):
+        return model(batch, training=False).numpy()
+
+    predict(np.zeros((1, 224, 224, 3), dtype=np.float32))  # build graphs before timing
+
+    print(f"{'threads':>8} {'single (faces/s)':>17} {'batched (faces/s)':>18} {'speedup':>8} {'mean batch':>11}")
+    for n_threads in args.threads:
+        single = run_load(predict, n_threads, args.requests)
+        batcher = MicroBatcher(predict, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        batched = run_load(batcher.submit, n_threads, args.requests)
+        mean_batch = batcher.stats()["mean_batch_size"]
+        print(f"{n_threads:>8} {single:>17.1f} {batched:>18.1f} {batched / single:>7.1f}x {mean_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import random
+import time
+import numpy as np
+from ranking import rank_varied
+
+# ---------------- Ranking benchmark ----------------
+# Times the vectorized ranking (ranking.py) against the per-song Python loop it
+# replaced, on synthetic catalogs, and checks that both draw from the same
+# distribution: how often each score band and each song ends up selected.
+#
+#   python backend/script/bench_ranking.py --sizes 1000 10000 100000
+#   python backend/script/bench_ranking.py --trials 20000   # distribution check
+
+
+def synthetic_catalog(n_songs, seed=42):
+    """Emotion scores in [0, 1], tempos around 120 BPM, 20 recently shown rows"""
+    rng = np.random.default_rng(seed)
+    scores = rng.beta(2, 2, size=n_songs).astype(np.float32)
+    tempos = rng.normal(120, 25, size=n_songs).clip(60, 200).astype(np.float32)
+    recent = rng.choice(n_songs, size=min(20, n_songs), replace=False)
+    return scores, tempos, recent
+
+
+def legacy_rank(scores, tempos, recent):
+    """The original get_varied_recommendations loop, kept here as the reference"""
+    recent_ids = [str(i) for i in recent]
+    song_data = []
+    for i, (score, tempo) in enumerate(zip(scores.tolist(), tempos.tolist())):
+        song_id = str(i)
+        recency_penalty = 0.5 if song_id in recent_ids else 1.0
+        random_factor = random.uniform(0.8, 1.2)
+        tempo_factor = 1.0 + (tempo - 120) / 240
+        song_data.append({
+            "row": i,
+            "original_score": score,
+            "diversity_score": score * recency_penalty * random_factor * tempo_factor,
+        })
+    song_data.sort(key=lambda x: x["diversity_score"], reverse=True)
+
+    top_songs = song_data[:min(20, len(song_data))]
+    high_score = [s for s in top_songs if s["original_score"] > 0.7]
+    mid_score = [s for s in top_songs if 0.4 <= s["original_score"] <= 0.7]
+    low_score = [s for s in top_songs if s["original_score"] < 0.4]
+
+    selected = []
+    if high_score:
+        selected.extend(random.sample(high_score, min(2, len(high_score))))
+    if mid_score:
+        selected.extend(random.sample(mid_score, min(2, len(mid_score))))
+    if low_score and len(selected) < 5:
+        selected.extend(random.sample(low_score, min(1, len(low_score))))
+    if len(selected) < 5:
+        available = [s for s in top_songs if s not in selected]
+        if available:
+            selected.extend(random.sample(available, min(5 - len(selected), len(available))))
+    random.shuffle(selected)
+    return [s["row"] for s in selected]
+
+
+def time_ranker(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return np.median(latencies) * 1e3
+
+
+def band_counts(scores, rows):
+    picked = scores[np.asarray(rows, dtype=np.int64)]
+    return np.array([(picked > 0.7).sum(), ((picked >= 0.4) & (picked <= 0.7)).sum(), (picked < 0.4).sum()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark varied ranking: NumPy vs the per-song loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--trials", type=int, default=5000, help="draws for the distribution check")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the vectorized ranking")
+    args = parser.parse_args()
+
+    print(f"{'songs':>9} {'loop (ms)':>10} {'numpy (ms)':>11} {'speedup':>8}")
+    for n_songs in args.sizes:
+        scores, tempos, recent = synthetic_catalog(n_songs)
+        fast = time_ranker(lambda: rank_varied(scores, tempos, recent), args.repeats)
+        if args.skip_legacy:
+            print(f"{n_songs:>9} {'-':>10} {fast:>11.2f} {'-':>8}")
+            continue
+        slow = time_ranker(lambda: legacy_rank(scores, tempos, recent), max(1, args.repeats // 5))
+        print(f"{n_songs:>9} {slow:>10.2f} {fast:>11.2f} {slow / fast:>7.0f}x")
+
+    # Same distribution: per-band share of picks and per-song pick rate on a small catalog
+    scores, tempos, recent = synthetic_catalog(200, seed=7)
+    legacy_bands, fast_bands = np.zeros(3), np.zeros(3)
+    legacy_hits, fast_hits = np.zeros(len(scores)), np.zeros(len(scores))
+    for _ in range(args.trials):
+        rows = legacy_rank(scores, tempos, recent)
+        legacy_bands += band_counts(scores, rows)
+        legacy_hits[rows] += 1
+        rows, _ = rank_varied(scores, tempos, recent)
+        fast_bands += band_counts(scores, rows)
+        fast_hits[rows] += 1
+
+    print(f"\nDistribution over {args.trials} draws (200 songs)")
+    print(f"{'':>8} {'high':>7} {'mid':>7} {'low':>7}")
+    print(f"{'loop':>8} " + " ".join(f"{v:>7.3f}" for v in legacy_bands / legacy_bands.sum()))
+    print(f"{'numpy':>8} " + " ".join(f"{v:>7.3f}" for v in fast_bands / fast_bands.sum()))
+    rates = legacy_hits / args.trials, fast_hits / args.trials
+    print(f"max per-song pick-rate difference: {np.abs(rates[0] - rates[1]).max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
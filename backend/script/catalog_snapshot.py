@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+# ---------------- Catalog snapshot ----------------
+# One in-memory copy of the song catalog per process, shared by every request:
+#   features  -> contiguous float32 matrix, one row per song (FEATURES order)
+#   ids / titles / artists / albums -> plain lists indexed by the same row
+# A background thread reloads it when the catalog changes (count, newest _id
+# or newest updated_at, the same fingerprint as song_decks.EmotionIndex) and
+# at least every CATALOG_MAX_AGE seconds, for edits that do not stamp
+# updated_at. Requests never touch MongoDB for the catalog.
+#
+# With a song-emotion model attached, the snapshot also carries each song's
+# emotion probabilities. They are stored on the song document (SCORES_FIELD)
+# together with the model version and the feature values they were computed
+# from; only songs that are new, edited or scored by an older model are run
+# through the model, and the result is written back so the next load (in any
+# process) finds it.
+
+# Columns fed to the song emotion model, in training order (train_recommender.py)
+FEATURES = ["danceability", "tempo", "acousticness", "energy", "valence"]
+FEATURE_DEFAULTS = {"danceability": 0.5, "tempo": 120.0, "acousticness": 0.5, "energy": 0.5, "valence": 0.5}
+METADATA = ["title", "artist", "album"]
+
+# Seconds between cheap change checks / forced full reloads
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", "15"))
+CATALOG_MAX_AGE = float(os.environ.get("CATALOG_MAX_AGE", "600"))
+CATALOG_BATCH_SIZE = int(os.environ.get("CATALOG_BATCH_SIZE", "5000"))
+
+# {"model": <version>, "features": [...], "p": [...]} on each song document
+SCORES_FIELD = "emotion_scores"
+
+
+def model_version(path):
+    """Version tag from the model file's content: identical in every checkout, image and pod"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"sha256-{digest.hexdigest()[:16]}"
+
+
+class Snapshot:
+    """Immutable view of the catalog at one point in time"""
+
+    def __init__(self, features, ids, titles, artists, albums, fingerprint, probabilities=None):
+        self.features = features
+        # float32 (songs x emotion classes), or None without a model
+        self.probabilities = probabilities
+        self.ids = ids
+        self.row_of = {song_id: row for row, song_id in enumerate(ids)}
+        self.titles = titles
+        self.artists = artists
+        self.albums = albums
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        return self.features[:, FEATURES.index(name)]
+
+    def song(self, row):
+        """Song dict for one row, shaped like the MongoDB document fields the API returns"""
+        song = {"_id": self.ids[row], "title": self.titles[row], "artist": self.artists[row], "album": self.albums[row]}
+        song.update(zip(FEATURES, self.features[row].tolist()))
+        return song
+
+
+class CatalogSnapshot:
+    """Holds the current Snapshot and keeps it fresh in a background thread"""
+
+    def __init__(self, collection, check_interval=CATALOG_CHECK_INTERVAL, max_age=CATALOG_MAX_AGE,
+                 model=None, model_version=None):
+        self.collection = collection
+        self.model = model
+        self.model_version = model_version
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """Current snapshot (loads it on first use if start() was not called)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.reload()
+        return snapshot
+
+    def start(self):
+        """Load now and keep refreshing in a daemon thread"""
+        self.reload()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="catalog-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _fingerprint(self):
+        """Song count, newest _id and newest updated_at: all index-only lookups"""
+        newest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        edited = self.collection.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])  # updated_at_1 index
+        return (
+            self.collection.estimated_document_count(),
+            str(newest["_id"]) if newest else None,
+            edited.get("updated_at") if edited else None,
+        )
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                snapshot = self._snapshot
+                stale = snapshot is None or time.time() - snapshot.loaded_at >= self.max_age
+                if stale or self._fingerprint() != snapshot.fingerprint:
+                    self.reload()
+            except Exception as e:
+                # Keep serving the previous snapshot; try again on the next tick
+                print(f"⚠️ Catalog refresh failed: {e}")
+
+    def reload(self):
+        """Read the catalog once and swap it in as a single reference"""
+        with self._reload_lock:
+            start = time.perf_counter()
+            fingerprint = self._fingerprint()
+            snapshot = self._load(fingerprint)
+            self._snapshot = snapshot
+            print(f"📀 Catalog snapshot: {len(snapshot)} songs in {time.perf_counter() - start:.2f}s")
+            return snapshot
+
+    def _load(self, fingerprint):
+        capacity = max(fingerprint[0], 1)
+        features = np.empty((capacity, len(FEATURES)), dtype=np.float32)
+        defaults = [FEATURE_DEFAULTS[f] for f in FEATURES]
+        ids, titles, artists, albums = [], [], [], []
+        stored_scores = []
+
+        projection = {f: 1 for f in FEATURES + METADATA + [SCORES_FIELD]}
+        n_rows = 0
+        for song in self.collection.find({}, projection).batch_size(CATALOG_BATCH_SIZE):
+            try:
+                row = [float(song.get(f, default)) for f, default in zip(FEATURES, defaults)]
+            except (TypeError, ValueError):
+                continue  # Skip songs with unusable features, as scan_face always did
+            if n_rows == capacity:
+                # The count is an estimate; grow if more songs arrived meanwhile
+                capacity *= 2
+                features = np.resize(features, (capacity, len(FEATURES)))
+            features[n_rows] = row
+            ids.append(str(song["_id"]))
+            titles.append(song.get("title", "Unknown Song"))
+            artists.append(song.get("artist", "Unknown Artist"))
+            albums.append(song.get("album", ""))
+            stored_scores.append(song.get(SCORES_FIELD))
+            n_rows += 1
+
+        features = np.ascontiguousarray(features[:n_rows])
+        probabilities = self._probabilities(features, ids, stored_scores) if self.model is not None else None
+        return Snapshot(features, ids, titles, artists, albums, fingerprint, probabilities)
+
+    def _probabilities(self, features, ids, stored_scores):
+        """Stored per-song probabilities; missing or stale rows are scored now and saved"""
+        n_classes = len(self.model.classes_)
+        probabilities = np.empty((len(ids), n_classes), dtype=np.float32)
+        missing = np.ones(len(ids), dtype=bool)
+        for row, stored in enumerate(stored_scores):
+            if (
+                stored and stored.get("model") == self.model_version
+                and len(stored.get("p", ())) == n_classes
+                and np.array_equal(np.asarray(stored.get("features"), dtype=np.float32), features[row])
+            ):
+                probabilities[row] = stored["p"]
+                missing[row] = False
+
+        rows = np.flatnonzero(missing)
+        if len(rows):
+            start = time.perf_counter()
+            probabilities[rows] = self.model.predict_proba(features[rows])
+            save_scores(self.collection, [ids[r] for r in rows], features[rows], probabilities[rows], self.model_version)
+            print(f"🧮 Scored {len(rows)} new/changed songs in {time.perf_counter() - start:.2f}s")
+        return probabilities
+
+
+def save_scores(collection, ids, features, probabilities, model_version, batch_size=CATALOG_BATCH_SIZE):
+    """Write per-song emotion probabilities (and what they were computed from) back to MongoDB"""
+    def key(song_id):
+        return ObjectId(song_id) if ObjectId.is_valid(song_id) else song_id
+
+    for start in range(0, len(ids), batch_size):
+        stop = start + batch_size
+        collection.bulk_write([
+            UpdateOne({"_id": key(song_id)}, {"$set": {SCORES_FIELD: {
+                "model": model_version,
+                "features": [float(v) for v in row_features],
+                "p": [float(v) for v in row_probabilities],
+            }}})
+            for song_id, row_features, row_probabilities in zip(
+                ids[start:stop], features[start:stop].tolist(), probabilities[start:stop].tolist()
+            )
+        ], ordered=False)
@@ -1,17 +1,33 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from io import BytesIO
-from PIL import Image
 import numpy as np
-import tensorflow as tf
 import base64
 import json
 import cv2
 import os
+import sys
+import time
 import joblib
 import random
-from pymongo import MongoClient
 from datetime import datetime
+from catalog_snapshot import CatalogSnapshot, model_version
+from ranking import rank_varied
+from inference_batcher import MicroBatcher
+from emotion_backends import load_emotion_backend
+from startup import Startup
+from face_detection import FACE_DETECTOR, detect_largest_face, load_detector
+from image_input import FaceTensor, open_rgb
+from emotion_stream import serve_stream
+from face_cache import FaceResultCache, dhash
+import serving
+from serving import ConcurrencyLimit, limit_concurrency
+from session_store import SESSION_STORE, load_session_store
+from metrics import Registry, metrics_response
+
+# Modules shared with backend/ml
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from mongo_indexes import prepare_database
+from music_db import CatalogStats, get_db, ping
 
 # ---------------- Flask setup ----------------
 app = Flask(__name__)
@@ -21,41 +37,133 @@ CORS(app)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "models")
 
-EMOTION_MODEL_PATH = os.path.join(MODEL_DIR, "emotion_cnn.keras")
+# keras | tflite-fp16 | tflite-int8 (see emotion_backends.py / export_emotion_model.py)
+EMOTION_BACKEND = os.environ.get("EMOTION_BACKEND", "keras")
 LABELS_PATH = os.path.join(MODEL_DIR, "emotion_cnn.labels.json")
 RECOMMENDER_PATH = os.path.join(MODEL_DIR, "song_recommender.joblib")
 ENCODER_PATH = os.path.join(MODEL_DIR, "emotion_encoder.joblib")
-CASCADE_PATH = os.path.join(BASE_DIR, "haarcascade_frontalface_default.xml")
 
-# ---------------- Load emotion CNN ----------------
-emotion_model = tf.keras.models.load_model(EMOTION_MODEL_PATH)
+# ---------------- Startup ----------------
+# Artifacts load concurrently in the background (see startup.py); the server
+# answers /api/ready with 503 and scan requests are refused until every phase,
+# including the warm-up inferences, is done.
+startup = Startup("emotion_api")
+
+emotion_model = None
+emotion_labels = None
+emotion_batcher = None
+face_cache = None
+song_recommender = None
+emotion_encoder = None
+recommender_version = None
+face_detector = None
+songs_collection = None
+catalog_stats = None
+catalog = None
+recent_songs = None  # recently shown song ids per user IP
+
+# Dummy faces pushed through the CNN before reporting ready (first calls trace graphs / plan buffers)
+WARMUP_RUNS = int(os.environ.get("EMOTION_WARMUP_RUNS", "2"))
+
+@startup.phase("emotion_cnn")
+def load_emotion_cnn():
+    global emotion_model, emotion_labels, emotion_batcher, face_cache
+    emotion_model = load_emotion_backend(EMOTION_BACKEND, MODEL_DIR)
 
-with open(LABELS_PATH, "r") as f:
-    emotion_labels = json.load(f)
+    with open(LABELS_PATH, "r") as f:
+        emotion_labels = json.load(f)
 
-print("✅ Emotion CNN loaded")
-print(f"🎭 Face emotions: {emotion_labels}")
+    # Faces from concurrent requests share one forward pass (INFERENCE_MAX_BATCH / INFERENCE_MAX_WAIT_MS)
+    emotion_batcher = MicroBatcher(emotion_model, name="emotion-cnn")
+
+    # Probabilities of each client's recent, near-identical face crops (FACE_CACHE_SIZE / _TTL / _MAX_DISTANCE)
+    face_cache = FaceResultCache(len(emotion_labels))
+
+    print(f"✅ Emotion CNN loaded ({EMOTION_BACKEND})")
+    print(f"🎭 Face emotions: {emotion_labels}")
 
-# ---------------- Load recommender ----------------
-song_recommender = joblib.load(RECOMMENDER_PATH)
-emotion_encoder = joblib.load(ENCODER_PATH)
+@startup.phase("recommender")
+def load_recommender():
+    global song_recommender, emotion_encoder, recommender_version
+    song_recommender = joblib.load(RECOMMENDER_PATH)
+    emotion_encoder = joblib.load(ENCODER_PATH)
 
-print("✅ Song recommender loaded")
-print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
+    # Version tag stored next to each song's precomputed probabilities: a hash of the
+    # joblib's content, so every process serving the same model agrees on it
+    recommender_version = model_version(RECOMMENDER_PATH)
+
+    print("✅ Song recommender loaded")
+    print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
+
+@startup.phase("face_detector")
+def load_face_detector():
+    global face_detector
+    # haar | dnn (FACE_DETECTOR), run on a downscaled grayscale copy (see face_detection.py)
+    face_detector = load_detector(FACE_DETECTOR)
+
+@startup.phase("mongo")
+def connect_mongo():
+    global songs_collection, catalog_stats
+    # Shared pooled client (MONGO_URI / MONGO_MAX_POOL_SIZE, see music_db.py)
+    ping()
+    db = get_db()
+    # Indexes for the hot queries, then an explain() check for collection scans (see mongo_indexes.py).
+    # Not fatal: without index privileges (or on a transient error) the service still works, just slower
+    try:
+        prepare_database(db)
+    except Exception as e:
+        print(f"⚠️ Index setup failed, continuing without it: {e}")
+    songs_collection = db["songs"]
+    # Total / per-emotion song counts, cached for CATALOG_STATS_TTL seconds
+    catalog_stats = CatalogStats(songs_collection)
 
-# ---------------- Load face detector ----------------
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-if face_cascade.empty():
-    raise RuntimeError("❌ Haar Cascade not loaded")
+@startup.phase("sessions", after=("mongo",))
+def open_session_store():
+    global recent_songs
+    # memory | shared | mongo (SESSION_STORE): bounded per user, shared across workers for shared / mongo
+    recent_songs = load_session_store(SESSION_STORE, songs_collection.database)
 
-# ---------------- MongoDB ----------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["musicDB"]
-songs_collection = db["songs"]
+@startup.phase("catalog", after=("mongo", "recommender"))
+def load_catalog():
+    global catalog
+    # Features, metadata and emotion probabilities of every song, kept in memory and refreshed in the background
+    catalog = CatalogSnapshot(songs_collection, model=song_recommender, model_version=recommender_version).start()
 
-# Session memory to track recently shown songs
-recent_songs = {}  # {user_ip: [song_ids]}
-MAX_RECENT_SONGS = 20
+@startup.phase("warmup", after=("emotion_cnn", "face_detector"))
+def warm_up():
+    dummy = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    face_detector.detect(cv2.cvtColor(dummy, cv2.COLOR_RGB2GRAY), dummy)
+    face = preprocess_face(dummy[:224, :224])
+    for _ in range(WARMUP_RUNS):
+        # Largest batch the batcher can form, so no request pays for the first one
+        emotion_model(np.repeat(face, emotion_batcher.max_batch, axis=0))
+        # Batch of one last: TFLite keeps the last batch size allocated, and a lone scan is the common case
+        emotion_model(face)
+
+# Scans doing decode / detection / inference at once; more wait, and past the queue limit get 503
+# (SCAN_CONCURRENCY / SCAN_QUEUE_LIMIT, see serving.py)
+scan_limit = ConcurrencyLimit()
+
+# ---------------- Metrics ----------------
+# Time per scan pipeline stage (decode, image_open, detect, preprocess, inference,
+# catalog_fetch, ranking, serialization) plus gauges read from the components
+# at scrape time; exported on GET /metrics (see metrics.py)
+metrics = Registry("emotion_api")
+stage_latency = metrics.histogram("stage_seconds", "Time spent in each scan pipeline stage", label="stage")
+scan_latency = metrics.histogram("scan_seconds", "End-to-end /api/scan-face time for answered scans")
+
+metrics.gauge("inference_queue_depth", "Faces waiting for the emotion CNN", lambda: emotion_batcher.stats()["queue_depth"])
+metrics.counter("inference_batches_total", "Emotion CNN forward passes", lambda: emotion_batcher.stats()["batches"])
+metrics.counter("inference_items_total", "Faces run through the emotion CNN", lambda: emotion_batcher.stats()["items"])
+metrics.gauge("scans_active", "Scans doing CPU work", lambda: scan_limit.stats()["active"])
+metrics.gauge("scans_waiting", "Scans waiting for a CPU slot", lambda: scan_limit.stats()["waiting"])
+metrics.counter("scans_rejected_total", "Scans answered 503 because the server was busy", lambda: scan_limit.stats()["rejected"])
+metrics.gauge("catalog_songs", "Songs in the in-memory catalog snapshot", lambda: len(catalog.get()))
+metrics.gauge("catalog_snapshot_age_seconds", "Age of the catalog snapshot", lambda: time.time() - catalog.get().loaded_at)
+metrics.counter("face_cache_requests_total", "Face-crop cache lookups", lambda: {"hit": face_cache.hits, "miss": face_cache.misses}, label="result")
+metrics.gauge("face_cache_hit_ratio", "Share of face crops answered from the cache", lambda: face_cache.stats()["hit_rate"])
+metrics.counter("catalog_stats_requests_total", "Song-count reads", lambda: {"cached": catalog_stats.hits, "refreshed": catalog_stats.refreshes}, label="result")
+metrics.gauge("sessions_active", "Users with a recent-song history", lambda: recent_songs.stats()["active_sessions"])
 
 # ---------------- Helpers ----------------
 def decode_base64_image(b64_string):
@@ -65,30 +173,90 @@ def decode_base64_image(b64_string):
         b64_string += "=" * (4 - missing_padding)
     return base64.b64decode(b64_string)
 
+def read_upload():
+    """
+    Image from the request: multipart field "image", a raw body
+    (application/octet-stream or image/*), or base64 JSON {"image": ...}
+    """
+    mimetype = request.mimetype or ""
+    if mimetype == "multipart/form-data":
+        upload = request.files.get("image")
+        return upload.stream if upload else None
+    if mimetype == "application/octet-stream" or mimetype.startswith("image/"):
+        return request.get_data(cache=False) or None
+    data = request.get_json(silent=True)
+    if not data or "image" not in data:
+        return None
+    with stage_latency.time("decode"):
+        return decode_base64_image(data["image"])
+
 def extract_face(pil_image):
-    img = np.array(pil_image.convert("RGB"))
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    # Detect on a smaller grayscale copy; the CNN gets the RGB crop it was trained on
+    with stage_latency.time("detect"):
+        box = detect_largest_face(face_detector, pil_image)
+        if box is None:
+            return None
 
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-    if len(faces) == 0:
-        return None
+        x, y, w, h = box
+        return np.asarray(pil_image.crop((x, y, x + w, y + h)))
 
-    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
-    return img[y:y+h, x:x+w]
+# Reusable (1, 224, 224, 3) input tensor per request thread
+face_tensor = FaceTensor()
 
 def preprocess_face(face_img):
-    face_img = cv2.resize(face_img, (224, 224))
-    face_img = face_img.astype(np.float32)
-    face_img = tf.keras.applications.mobilenet_v2.preprocess_input(face_img)
-    return np.expand_dims(face_img, axis=0)
+    # Resize + mobilenet_v2.preprocess_input ([0, 255] -> [-1, 1]) into the preallocated tensor
+    return face_tensor.fill(face_img)
+
+def predict_face_emotion(image, client=None):
+    """Face-emotion probabilities for a decoded RGB image, or None if no face is found
+
+    With a client (user IP), a near-identical crop that client sent recently is answered
+    from face_cache; without one (streams) the CNN always runs.
+    """
+    face = extract_face(image)
+    if face is None:
+        return None
+
+    # Same pose and light as this client's recent scan: reuse its result instead of running the CNN
+    if client is not None:
+        key = dhash(face)
+        preds = face_cache.get(client, key)
+        if preds is not None:
+            return preds
 
-def get_varied_recommendations(features, valid_songs, target_emotion=None, user_ip=None):
+    with stage_latency.time("preprocess"):
+        tensor = preprocess_face(face)
+    # Includes the wait for the micro-batch to form
+    with stage_latency.time("inference"):
+        preds = emotion_batcher.submit(tensor)[0]
+    if client is not None:
+        face_cache.put(client, key, preds)
+    return preds
+
+def format_songs(snapshot, ranked_songs):
+    recommended_songs = []
+    for row, score in ranked_songs[:5]:  # Get top 5
+        song = snapshot.song(row)
+        recommended_songs.append({
+            "title": song.get("title", "Unknown Song"),
+            "artist": song.get("artist", "Unknown Artist"),
+            "album": song.get("album", ""),
+            "score": round(float(score), 3),
+            "danceability": round(float(song.get("danceability", 0)), 2),
+            "energy": round(float(song.get("energy", 0)), 2),
+            "valence": round(float(song.get("valence", 0)), 2),
+            "tempo": round(float(song.get("tempo", 0)), 1)
+        })
+    return recommended_songs
+
+def get_varied_recommendations(snapshot, target_emotion=None, user_ip=None):
     """
-    Get varied song recommendations with randomization
+    Get varied song recommendations with randomization.
+    Returns (row, score) pairs; rows index into `snapshot`.
     """
     try:
-        # Get emotion probabilities for all songs
-        probabilities = song_recommender.predict_proba(features)
+        # Emotion probabilities for all songs, precomputed with the catalog snapshot
+        probabilities = snapshot.probabilities
         
         # Calculate scores based on target emotion
         if target_emotion and target_emotion in emotion_encoder.classes_:
@@ -99,92 +267,25 @@ def get_varied_recommendations(features, valid_songs, target_emotion=None, user_
             # For neutral: find balanced songs
             scores = 1 - np.max(probabilities, axis=1)
         
-        # Get recently shown songs for this user (if tracking)
-        recent_song_ids = []
-        if user_ip and user_ip in recent_songs:
-            recent_song_ids = recent_songs[user_ip]
-        
-        # Combine songs with their scores and other metrics for variety
-        song_data = []
-        for i, (song, score) in enumerate(zip(valid_songs, scores)):
-            song_id = str(song.get("_id", i))
-            
-            # Calculate variety factors
-            danceability = float(song.get("danceability", 0.5))
-            energy = float(song.get("energy", 0.5))
-            tempo = float(song.get("tempo", 120))
-            
-            # Penalty for recently shown songs
-            recency_penalty = 0.5 if song_id in recent_song_ids else 1.0
-            
-            # Add some randomness to avoid always same order
-            random_factor = random.uniform(0.8, 1.2)
-            
-            # Combine score with variety factors
-            # Higher tempo and energy get slight boost for variety
-            tempo_factor = 1.0 + (tempo - 120) / 240  # ±20% based on tempo
-            diversity_score = score * recency_penalty * random_factor * tempo_factor
-            
-            song_data.append({
-                "song": song,
-                "original_score": score,
-                "diversity_score": diversity_score,
-                "song_id": song_id,
-                "danceability": danceability,
-                "energy": energy
-            })
-        
-        # Sort by diversity score (not just emotion score)
-        song_data.sort(key=lambda x: x["diversity_score"], reverse=True)
-        
-        # Strategy 1: Take top 20, then shuffle selection
-        top_n = min(20, len(song_data))
-        top_songs = song_data[:top_n]
-        
-        # Group by score ranges for variety
-        high_score = [s for s in top_songs if s["original_score"] > 0.7]
-        mid_score = [s for s in top_songs if 0.4 <= s["original_score"] <= 0.7]
-        low_score = [s for s in top_songs if s["original_score"] < 0.4]
-        
-        # Select mix of songs from different score ranges
-        selected = []
-        
-        # Take 2 from high score (if available)
-        if high_score:
-            selected.extend(random.sample(high_score, min(2, len(high_score))))
-        
-        # Take 2 from mid score (if available)
-        if mid_score:
-            selected.extend(random.sample(mid_score, min(2, len(mid_score))))
-        
-        # Take 1 from low score for variety (if available)
-        if low_score and len(selected) < 5:
-            selected.extend(random.sample(low_score, min(1, len(low_score))))
+        # Rows of recently shown songs for this user (if tracking)
+        recent_ids = recent_songs.recent(user_ip) if user_ip else []
+        recent_rows = [snapshot.row_of[i] for i in recent_ids if i in snapshot.row_of]
         
-        # If we still don't have 5 songs, fill from top songs
-        if len(selected) < 5:
-            remaining_needed = 5 - len(selected)
-            # Get songs not already selected
-            available = [s for s in top_songs if s not in selected]
-            if available:
-                selected.extend(random.sample(available, min(remaining_needed, len(available))))
+        # Recency penalty, jitter and tempo factor over all songs at once,
+        # then a stratified draw from the top band (see ranking.py)
+        rows, row_scores = rank_varied(scores, snapshot.column("tempo"), np.array(recent_rows, dtype=np.int64))
+        selected = list(zip(rows.tolist(), row_scores.tolist()))
         
-        # Shuffle the final selection
-        random.shuffle(selected)
-        
-        # Update recent songs (simplified - using session memory)
+        # Update recent songs (kept to the last SESSION_MAX_RECENT per user)
         if user_ip:
-            new_recent_ids = [s["song_id"] for s in selected]
-            if user_ip not in recent_songs:
-                recent_songs[user_ip] = []
-            recent_songs[user_ip] = (recent_songs[user_ip] + new_recent_ids)[-MAX_RECENT_SONGS:]
+            recent_songs.add(user_ip, [snapshot.ids[row] for row, _ in selected])
         
-        return [(item["song"], item["original_score"]) for item in selected]
+        return selected
         
     except Exception as e:
         print(f"⚠️ Error in varied recommendations: {e}")
         # Fallback: random selection
-        combined = list(zip(valid_songs, scores if 'scores' in locals() else [0]*len(valid_songs)))
+        combined = list(zip(range(len(snapshot)), scores if 'scores' in locals() else [0]*len(snapshot)))
         random.shuffle(combined)
         return combined[:5]
 
@@ -209,39 +310,45 @@ def map_face_to_song_emotion(face_emotion):
 
 # ---------------- API ----------------
 @app.route("/api/scan-face", methods=["POST"])
+@limit_concurrency(scan_limit, {"error": "Server busy, try again", "emotion": "neutral", "songs": []})
 def scan_face():
+    if not startup.ready:
+        return jsonify({"error": "Service is starting", "emotion": "neutral", "songs": []}), 503
+
     start_time = datetime.now()
+    started = time.perf_counter()
     print(f"\n📸 New scan request at {start_time.strftime('%H:%M:%S')}")
     
     # Get user IP for session tracking
     user_ip = request.remote_addr
     
-    data = request.get_json()
-    if not data or "image" not in data:
+    try:
+        source = read_upload()
+    except Exception as e:
+        print(f"❌ Image error: {e}")
+        return jsonify({"error": f"Invalid image: {str(e)}", "emotion": "neutral", "songs": []}), 400
+    if source is None:
         return jsonify({"error": "Image not provided", "emotion": "neutral", "songs": []}), 400
 
     try:
-        image_bytes = decode_base64_image(data["image"])
-        image = Image.open(BytesIO(image_bytes))
+        # Decoded at reduced size (JPEG draft mode)
+        with stage_latency.time("image_open"):
+            image = open_rgb(source)
         print("✅ Image decoded successfully")
     except Exception as e:
         print(f"❌ Image error: {e}")
         return jsonify({"error": f"Invalid image: {str(e)}", "emotion": "neutral", "songs": []}), 400
 
-    # Face detection
-    face = extract_face(image)
-    if face is None:
+    # Face detection + emotion prediction
+    preds = predict_face_emotion(image, client=user_ip)
+    if preds is None:
         print("⚠️ No face detected")
         face_emotion = "neutral"
         confidence = 0.0
     else:
-        # Emotion prediction
-        face_tensor = preprocess_face(face)
-        preds = emotion_model.predict(face_tensor, verbose=0)
-        
         emotion_idx = int(np.argmax(preds))
         face_emotion = emotion_labels[emotion_idx]
-        confidence = float(preds[0][emotion_idx])
+        confidence = float(preds[emotion_idx])
         
         print(f"🎭 Face emotion: {face_emotion} ({confidence:.1%} confidence)")
 
@@ -249,114 +356,169 @@ def scan_face():
     song_emotion = map_face_to_song_emotion(face_emotion)
     print(f"🎵 Mapped to song emotion: {song_emotion}")
 
-    # Fetch all songs
-    all_songs = list(songs_collection.find())
-    print(f"📊 Total songs in database: {len(all_songs)}")
-    
-    if not all_songs:
-        print("❌ No songs in database")
-        return jsonify({"emotion": song_emotion, "songs": []}), 200
-
-    # Prepare features
-    features = []
-    valid_songs = []
-    
-    for song in all_songs:
-        try:
-            features.append([
-                float(song.get("danceability", 0.5)),
-                float(song.get("tempo", 120.0)),
-                float(song.get("acousticness", 0.5)),
-                float(song.get("energy", 0.5)),
-                float(song.get("valence", 0.5))
-            ])
-            valid_songs.append(song)
-        except Exception as e:
-            continue  # Skip songs with missing features
-
-    if not features:
+    # Songs come from the in-memory snapshot (features already a float32 matrix)
+    with stage_latency.time("catalog_fetch"):
+        snapshot = catalog.get()
+    if len(snapshot) == 0:
         print("❌ No songs with valid features")
         return jsonify({"emotion": song_emotion, "songs": []}), 200
 
-    X = np.array(features)
-    print(f"✅ Processing {len(features)} valid songs")
+    print(f"✅ Processing {len(snapshot)} valid songs")
 
     # Get varied song recommendations
-    ranked_songs = get_varied_recommendations(X, valid_songs, song_emotion, user_ip)
+    with stage_latency.time("ranking"):
+        ranked_songs = get_varied_recommendations(snapshot, song_emotion, user_ip)
     
     # Prepare response
-    recommended_songs = []
-    for song, score in ranked_songs[:5]:  # Get top 5
-        recommended_songs.append({
-            "title": song.get("title", "Unknown Song"),
-            "artist": song.get("artist", "Unknown Artist"),
-            "album": song.get("album", ""),
-            "score": round(float(score), 3),
-            "danceability": round(float(song.get("danceability", 0)), 2),
-            "energy": round(float(song.get("energy", 0)), 2),
-            "valence": round(float(song.get("valence", 0)), 2),
-            "tempo": round(float(song.get("tempo", 0)), 1)
-        })
+    with stage_latency.time("serialization"):
+        recommended_songs = format_songs(snapshot, ranked_songs)
 
-    # Calculate response time
-    response_time = (datetime.now() - start_time).total_seconds()
+        # Calculate response time
+        response_time = (datetime.now() - start_time).total_seconds()
+
+        response = jsonify({
+            "emotion": song_emotion,
+            "face_emotion": face_emotion,
+            "confidence": round(confidence, 3),
+            "songs": recommended_songs,
+            "response_time": response_time,
+            "total_songs_considered": len(snapshot),
+            "selection_type": "varied"  # Indicate varied selection
+        })
+    scan_latency.observe(time.perf_counter() - started)
     
     print(f"✅ Recommended {len(recommended_songs)} varied songs for '{song_emotion}'")
     print(f"🎲 Songs: {[s['title'] for s in recommended_songs]}")
     print(f"⏱️  Response time: {response_time:.2f}s")
     
-    return jsonify({
-        "emotion": song_emotion,
-        "face_emotion": face_emotion,
-        "confidence": round(confidence, 3),
-        "songs": recommended_songs,
-        "response_time": response_time,
-        "total_songs_considered": len(features),
-        "selection_type": "varied"  # Indicate varied selection
-    }), 200
+    return response, 200
+
+# ---------------- Streaming scan ----------------
+# ws://<host>:5000/api/scan-stream  (needs flask-sock; see emotion_stream.py for the protocol)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+def _frame_source(frame):
+    """Binary frames are image bytes; text frames are base64 or {"image": base64}"""
+    if isinstance(frame, (bytes, bytearray)):
+        return frame
+    if frame.lstrip().startswith("{"):
+        frame = json.loads(frame)["image"]
+    return decode_base64_image(frame)
+
+# Only where the server can upgrade connections: `python emotion_api.py` with waitress cannot,
+# an import (gunicorn emotion_api:app) or the Werkzeug / --dev server can (see serving.py)
+scan_stream_enabled = Sock is not None and (__name__ != "__main__" or serving.supports_websockets())
+
+if scan_stream_enabled:
+    sock = Sock(app)
+
+    @sock.route("/api/scan-stream")
+    def scan_stream(ws):
+        if not startup.ready:
+            ws.send(json.dumps({"type": "error", "error": "Service is starting"}))
+            return
+
+        user_ip = request.remote_addr
+
+        def recommend(face_emotion):
+            song_emotion = map_face_to_song_emotion(face_emotion)
+            snapshot = catalog.get()
+            ranked_songs = get_varied_recommendations(snapshot, song_emotion, user_ip) if len(snapshot) else []
+            return {"emotion": song_emotion, "songs": format_songs(snapshot, ranked_songs)}
+
+        print(f"\n📡 Scan stream opened by {user_ip}")
+        serve_stream(
+            ws,
+            emotion_labels,
+            # No client: stream frames bypass face_cache, so the smoothed emotion follows every frame
+            analyze=lambda frame: predict_face_emotion(open_rgb(_frame_source(frame))),
+            recommend=recommend,
+            group=map_face_to_song_emotion,
+            # Decode / detection / inference of each frame share the slots with /api/scan-face
+            limit=scan_limit,
+        )
+elif Sock is None:
+    print("⚠️ flask-sock not installed: /api/scan-stream disabled (pip install flask-sock)")
+else:
+    print("⚠️ waitress cannot upgrade WebSockets: /api/scan-stream disabled (serve with gunicorn, see serving.py)")
 
 # ---------------- Reset recent songs ----------------
 @app.route("/api/reset-history", methods=["POST"])
 def reset_history():
     """Reset recent song history for a user"""
+    if recent_songs is None:
+        return jsonify({"error": "Service is starting"}), 503
     user_ip = request.remote_addr
-    if user_ip in recent_songs:
-        recent_songs[user_ip] = []
+    if recent_songs.reset(user_ip):
         return jsonify({"message": "History reset for your session"}), 200
     return jsonify({"message": "No history found"}), 200
 
+# ---------------- Inference stats ----------------
+@app.route("/api/inference-stats", methods=["GET"])
+def inference_stats():
+    """Emotion CNN batching: queue depth and batch-size histograms"""
+    if emotion_batcher is None:
+        return jsonify({"error": "Service is starting"}), 503
+    return jsonify({**emotion_batcher.stats(), "face_cache": face_cache.stats(), "scan_limit": scan_limit.stats()}), 200
+
+# ---------------- Prometheus metrics ----------------
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Per-stage latency histograms, queue depth, catalog size and cache hit rates"""
+    return metrics_response(metrics)
+
+# ---------------- Readiness ----------------
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    """200 once every startup phase (incl. warm-up) finished, 503 before; for load balancers"""
+    return jsonify(startup.status()), 200 if startup.ready else 503
+
 # ---------------- Health check ----------------
 @app.route("/api/health", methods=["GET"])
 def health():
     """Health check endpoint"""
+    if not startup.ready:
+        # Alive but still loading (or failed to load): details in the startup status
+        status = startup.status()
+        return jsonify({
+            "status": "unhealthy" if status["finished"] else "starting",
+            "startup": status,
+            "timestamp": datetime.now().isoformat()
+        }), 500 if status["finished"] else 200
+
     try:
-        total_songs = songs_collection.count_documents({})
+        counts = catalog_stats.get()
         
-        # Get some random sample songs
-        all_songs = list(songs_collection.find({}, {"title": 1, "artist": 1}))
-        if all_songs:
-            sample_songs = random.sample(all_songs, min(5, len(all_songs)))
-            sample_titles = [f"{s.get('title', 'Unknown')} - {s.get('artist', 'Unknown')}" 
-                           for s in sample_songs]
-        else:
-            sample_titles = []
+        # Get some random sample songs (from the snapshot, no collection scan)
+        snapshot = catalog.get()
+        sample_rows = random.sample(range(len(snapshot)), min(5, len(snapshot)))
+        sample_titles = [f"{snapshot.titles[i]} - {snapshot.artists[i]}" for i in sample_rows]
         
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "models": {
                 "face_emotions": emotion_labels,
+                "emotion_backend": EMOTION_BACKEND,
+                "face_detector": FACE_DETECTOR,
                 "song_emotions": list(emotion_encoder.classes_),
                 "recommendation_strategy": "varied_with_randomization"
             },
             "database": {
-                "total_songs": total_songs,
+                "total_songs": counts["total"],
+                "songs_by_emotion": counts["by_emotion"],
                 "sample_songs": sample_titles,
+                "snapshot_songs": len(snapshot),
+                "snapshot_age_seconds": round(datetime.now().timestamp() - snapshot.loaded_at, 1),
             },
-            "session": {
-                "active_sessions": len(recent_songs),
-                "max_recent_songs": MAX_RECENT_SONGS
-            }
+            "inference": emotion_batcher.stats(),
+            "face_cache": face_cache.stats(),
+            "scan_limit": scan_limit.stats(),
+            "startup": startup.status(),
+            "session": recent_songs.stats()
         }), 200
     except Exception as e:
         return jsonify({
@@ -366,25 +528,41 @@ def health():
         }), 500
 
 # ---------------- Run ----------------
+startup.start()
+
 if __name__ == "__main__":
-    print("\n" + "="*60)
-    print("🎵 MOOD MUSIC RECOMMENDATION SYSTEM")
-    print("="*60)
-    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"🎭 Face emotions: {emotion_labels}")
-    print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
-    print(f"💿 Songs in database: {songs_collection.count_documents({})}")
-    print("🎲 Recommendation strategy: VARIED WITH RANDOMIZATION")
-    print("="*60)
-    print("🌐 API Server: http://0.0.0.0:5000")
-    print("📱 Frontend: http://192.168.18.240:5000")
-    print("🔧 Endpoints:")
-    print("   POST /api/scan-face    - Scan face and get varied songs")
-    print("   POST /api/reset-history- Reset song history")
-    print("   GET  /api/health       - System health check")
-    print("="*60 + "\n")
-    
+    def print_banner(ready):
+        if not ready:
+            print("❌ Startup failed, see the phase errors above (/api/health reports them)")
+            return
+        print("\n" + "="*60)
+        print("🎵 MOOD MUSIC RECOMMENDATION SYSTEM")
+        print("="*60)
+        print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"🎭 Face emotions: {emotion_labels}")
+        print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
+        print(f"💿 Songs in database: {catalog_stats.count()}")
+        print("🎲 Recommendation strategy: VARIED WITH RANDOMIZATION")
+        print("="*60)
+        print("🌐 API Server: http://0.0.0.0:5000")
+        print("📱 Frontend: http://192.168.18.240:5000")
+        print("🔧 Endpoints:")
+        print("   POST /api/scan-face    - Scan face and get varied songs")
+        print("        (JSON base64, multipart 'image' or application/octet-stream body)")
+        if scan_stream_enabled:
+            print("   WS   /api/scan-stream  - Continuous scanning (frames in, smoothed emotion out)")
+        print("   POST /api/reset-history- Reset song history")
+        print("   GET  /api/health       - System health check")
+        print("   GET  /api/ready        - Readiness (503 until loaded and warmed up)")
+        print("   GET  /api/inference-stats - CNN batch sizes and queue depth")
+        print("   GET  /metrics          - Prometheus metrics (per-stage latency, caches)")
+        print("="*60 + "\n")
+
     # Seed random for reproducibility
     random.seed(datetime.now().timestamp())
-    
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+
+    # Bind the port now: /api/ready answers 503 until loading finishes, then the banner prints
+    startup.on_finish(print_banner)
+
+    # Production server unless --dev / SERVE_MODE=dev (see serving.py)
+    serving.run(app, host="0.0.0.0", port=5000)
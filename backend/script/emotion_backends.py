@@ -0,0 +1,80 @@
+import os
+import numpy as np
+
+# ---------------- Emotion CNN backends ----------------
+# Every backend is a callable: float32 batch (N, 224, 224, 3), already
+# preprocessed to [-1, 1] -> class probabilities (N, n_classes).
+#
+#   keras        models/emotion_cnn.keras through full TensorFlow
+#   tflite-fp16  models/emotion_cnn.fp16.tflite  (export_emotion_model.py)
+#   tflite-int8  models/emotion_cnn.int8.tflite  (export_emotion_model.py)
+#
+# TFLite models run through tflite_runtime when it is installed, so a
+# serving box does not need TensorFlow at all; otherwise tf.lite is used.
+
+BACKENDS = ("keras", "tflite-fp16", "tflite-int8")
+MODEL_FILES = {
+    "keras": "emotion_cnn.keras",
+    "tflite-fp16": "emotion_cnn.fp16.tflite",
+    "tflite-int8": "emotion_cnn.int8.tflite",
+}
+
+
+def _tflite_interpreter(path):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=os.cpu_count())
+
+
+class KerasBackend:
+    def __init__(self, path):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(path)
+
+    def __call__(self, batch):
+        # Direct call instead of predict(): no per-call dataset/callback setup
+        return self.model(batch, training=False).numpy()
+
+
+class TFLiteBackend:
+    """Not thread-safe: call from one thread (the micro-batcher's worker)"""
+
+    def __init__(self, path):
+        self.interpreter = _tflite_interpreter(path)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def _quantize(self, batch, details):
+        scale, zero_point = details["quantization"]
+        if details["dtype"] == np.float32 or scale == 0:
+            return batch.astype(details["dtype"])
+        limits = np.iinfo(details["dtype"])
+        return np.clip(np.round(batch / scale + zero_point), limits.min, limits.max).astype(details["dtype"])
+
+    def __call__(self, batch):
+        if len(batch) != self.batch_size:
+            # Re-plan buffers only when the batch size changes
+            self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(batch)
+        self.interpreter.set_tensor(self.input["index"], self._quantize(batch, self.input))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output["index"])
+        scale, zero_point = self.output["quantization"]
+        if self.output["dtype"] != np.float32 and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def load_emotion_backend(name, model_dir):
+    """Backend `name` loaded from model_dir"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown emotion backend: '{name}'. Use one of {BACKENDS}")
+    path = os.path.join(model_dir, MODEL_FILES[name])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found" + (" (run export_emotion_model.py)" if name != "keras" else ""))
+    return KerasBackend(path) if name == "keras" else TFLiteBackend(path)
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+# ---------------- Streaming face scan ----------------
+# One WebSocket per scanning client. The client sends frames (binary JPEG/PNG,
+# or text: base64 / {"image": base64}); the server answers with JSON:
+#
+#   {"type": "emotion", ...}          after every processed frame
+#   {"type": "recommendations", ...}  only when the smoothed emotion changes
+#
+# Frame dropping: after finishing a frame the server drains everything that
+# queued up meanwhile and keeps only the newest frame, so a slow server
+# processes fewer frames instead of falling further behind.
+# Smoothing: face-emotion probabilities are averaged over the last
+# STREAM_WINDOW frames with a face; the smoothed emotion only switches when
+# the new one leads the current one by STREAM_SWITCH_MARGIN, so one odd
+# frame does not reshuffle the playlist.
+# Concurrency: with a `limit` (serving.ConcurrencyLimit), each frame's decode,
+# detection and inference run inside it, sharing the slots with one-shot
+# scans; a frame that finds it full is skipped with a "busy" error.
+
+STREAM_WINDOW = int(os.environ.get("STREAM_WINDOW", "8"))
+STREAM_SWITCH_MARGIN = float(os.environ.get("STREAM_SWITCH_MARGIN", "0.1"))
+
+
+class EmotionSmoother:
+    """Sliding-window mean of probability vectors with a switching margin"""
+
+    def __init__(self, labels, window=STREAM_WINDOW, margin=STREAM_SWITCH_MARGIN):
+        self.labels = list(labels)
+        self.margin = margin
+        self.window = deque(maxlen=max(1, window))
+        self.current = None
+
+    def update(self, probabilities):
+        """Add one frame; returns (smoothed label, smoothed probabilities)"""
+        self.window.append(np.asarray(probabilities, dtype=np.float32))
+        smoothed = np.mean(self.window, axis=0)
+        best = int(np.argmax(smoothed))
+        if self.current is None:
+            self.current = best
+        elif best != self.current and smoothed[best] - smoothed[self.current] >= self.margin:
+            self.current = best
+        return self.labels[self.current], smoothed
+
+
+def _receive_latest(ws, stats):
+    """Block for one frame, then skip to the newest one already waiting"""
+    frame = ws.receive()
+    stats["received"] += 1
+    while True:
+        newer = ws.receive(timeout=0)
+        if newer is None:
+            return frame
+        frame = newer
+        stats["received"] += 1
+        stats["dropped"] += 1
+
+
+def serve_stream(ws, labels, analyze, recommend, group=lambda label: label, limit=None):
+    """
+    Run one streaming session until the client disconnects.
+
+    analyze(frame) -> face-emotion probabilities, or None when no face was found
+    recommend(label) -> JSON-able recommendations for a smoothed face emotion
+    group(label) -> what must change before recommending again (e.g. the mapped song emotion)
+    limit -> optional ConcurrencyLimit held around each analyze(frame)
+    """
+    smoother = EmotionSmoother(labels)
+    stats = {"received": 0, "processed": 0, "dropped": 0, "busy": 0, "no_face": 0, "recommendations": 0}
+    last_group = None
+
+    while True:
+        frame = _receive_latest(ws, stats)
+        start = time.perf_counter()
+        if limit is not None and not limit.try_enter():
+            stats["busy"] += 1
+            ws.send(json.dumps({"type": "error", "error": "Server busy, frame skipped", "frames": stats}))
+            continue
+        try:
+            probabilities = analyze(frame)
+        except Exception as e:
+            ws.send(json.dumps({"type": "error", "error": f"Invalid frame: {e}", "frames": stats}))
+            continue
+        finally:
+            if limit is not None:
+                limit.leave()
+        stats["processed"] += 1
+
+        if probabilities is None:
+            stats["no_face"] += 1
+            ws.send(json.dumps({"type": "emotion", "face_detected": False, "frames": stats}))
+            continue
+
+        label, smoothed = smoother.update(probabilities)
+        ws.send(json.dumps({
+            "type": "emotion",
+            "face_detected": True,
+            "face_emotion": label,
+            "confidence": round(float(smoothed[labels.index(label)]), 3),
+            "smoothed": {l: round(float(p), 3) for l, p in zip(labels, smoothed)},
+            "frame_ms": round((time.perf_counter() - start) * 1000, 1),
+            "frames": stats,
+        }))
+
+        if group(label) != last_group:
+            last_group = group(label)
+            stats["recommendations"] += 1
+            ws.send(json.dumps({"type": "recommendations", "face_emotion": label, **recommend(label)}))
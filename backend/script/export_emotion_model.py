@@ -0,0 +1,168 @@
+# Export the trained emotion CNN for lightweight CPU serving
+# Produces float16 and int8 TFLite models and a parity/latency report vs. Keras
+#
+#   python export_emotion_model.py                       # export + report
+#   python export_emotion_model.py --calibration 300 --eval-limit 0
+#
+# The report is computed on the faces train_emotion_model.py held out for
+# validation (same split and seed), never on the faces used to calibrate int8.
+#
+# Serve one of them with EMOTION_BACKEND=tflite-fp16 | tflite-int8 (emotion_api.py)
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from emotion_backends import MODEL_FILES, load_emotion_backend
+
+# ---------------- CONFIG ----------------
+IMG_SIZE = (224, 224)
+VAL_SPLIT = 0.1   # as in train_emotion_model.py
+SEED = 42
+FORMATS = (".bmp", ".gif", ".jpeg", ".jpg", ".png")
+
+BASE_DIR = Path(__file__).resolve().parent
+FACES_DIR = BASE_DIR.parent.parent / "image" / "faces"   # happy/neutral/sad inside this folder
+MODEL_DIR = BASE_DIR / "models"
+MODEL_PATH = MODEL_DIR / MODEL_FILES["keras"]
+LABELS_PATH = MODEL_DIR / "emotion_cnn.labels.json"
+REPORT_PATH = MODEL_DIR / "emotion_cnn.export_report.json"
+
+# ---------------------------------------
+
+
+def list_faces(faces_dir, labels):
+    """(path, class index) for every image under faces_dir/<label>/"""
+    samples = []
+    for idx, label in enumerate(labels):
+        for path in sorted((Path(faces_dir) / label).glob("*")):
+            if path.suffix.lower() in FORMATS:
+                samples.append((path, idx))
+    return samples
+
+
+def split_faces(samples, validation_split=VAL_SPLIT, seed=SEED):
+    """(training, validation) exactly as image_dataset_from_directory(subset=...) splits them
+
+    Keras shuffles the sorted file list with RandomState(seed) and holds out the
+    last int(validation_split * n) files; the model never trained on those.
+    """
+    shuffled = list(samples)
+    np.random.RandomState(seed).shuffle(shuffled)
+    n_val = int(validation_split * len(shuffled))
+    return shuffled[:len(shuffled) - n_val], shuffled[len(shuffled) - n_val:]
+
+
+def load_face(path):
+    img = tf.keras.utils.load_img(path, target_size=IMG_SIZE, color_mode="rgb")
+    x = tf.keras.utils.img_to_array(img)
+    return preprocess_input(x)[np.newaxis, ...].astype(np.float32)
+
+
+def export_fp16(model):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def export_int8(model, calibration):
+    """Weights and activations in int8, ranges calibrated on real faces; float in/out"""
+    def representative_dataset():
+        for path, _ in calibration:
+            yield [load_face(path)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def evaluate(backend, samples, reference=None):
+    """Accuracy, agreement with the reference predictions and per-face latency"""
+    predictions, latencies = [], []
+    for path, _ in samples:
+        x = load_face(path)
+        start = time.perf_counter()
+        probs = backend(x)
+        latencies.append(time.perf_counter() - start)
+        predictions.append(int(np.argmax(probs[0])))
+
+    predictions = np.array(predictions)
+    truth = np.array([label for _, label in samples])
+    latencies = np.array(latencies) * 1e3
+    result = {
+        "accuracy": round(float((predictions == truth).mean()), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+    }
+    if reference is not None:
+        result["agreement_with_keras"] = round(float((predictions == reference).mean()), 4)
+    return result, predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export fp16/int8 TFLite emotion models and compare them with Keras")
+    parser.add_argument("--faces", default=str(FACES_DIR))
+    parser.add_argument("--calibration", type=int, default=200, help="training faces used to calibrate int8 ranges")
+    parser.add_argument("--eval-limit", type=int, default=600, help="validation faces in the report (0 = all)")
+    args = parser.parse_args()
+
+    with open(LABELS_PATH, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+
+    samples = list_faces(args.faces, labels)
+    if not samples:
+        raise SystemExit(f"❌ No faces found under {args.faces}")
+    training, validation = split_faces(samples)
+    if not validation:
+        raise SystemExit(f"❌ Too few faces under {args.faces} for a validation split")
+    # Calibrate on training faces, report on held-out ones: the two never overlap
+    rng = np.random.default_rng(SEED)
+    calibration = [training[i] for i in rng.permutation(len(training))[:args.calibration]]
+    evaluation = validation[:args.eval_limit] if args.eval_limit else validation
+    print(f"✅ {len(samples)} faces found, {len(calibration)} training faces for calibration,"
+          f" {len(evaluation)} validation faces for the report")
+
+    model = tf.keras.models.load_model(MODEL_PATH)
+
+    print("\n🚀 Exporting float16")
+    (MODEL_DIR / MODEL_FILES["tflite-fp16"]).write_bytes(export_fp16(model))
+    print("🚀 Exporting int8 (calibrating)")
+    (MODEL_DIR / MODEL_FILES["tflite-int8"]).write_bytes(export_int8(model, calibration))
+
+    report = {
+        "faces": len(evaluation),
+        "evaluation_split": f"validation ({VAL_SPLIT:g}, seed {SEED})",
+        "calibration_faces": len(calibration),
+        "backends": {},
+    }
+    reference = None
+    for name in ("keras", "tflite-fp16", "tflite-int8"):
+        backend = load_emotion_backend(name, MODEL_DIR)
+        backend(load_face(evaluation[0][0]))  # warm-up
+        result, predictions = evaluate(backend, evaluation, reference)
+        if name == "keras":
+            reference = predictions
+        result["size_mb"] = round(os.path.getsize(MODEL_DIR / MODEL_FILES[name]) / 1e6, 2)
+        report["backends"][name] = result
+
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'backend':>12} {'size MB':>8} {'accuracy':>9} {'agree':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for name, r in report["backends"].items():
+        agree = r.get("agreement_with_keras", 1.0)
+        print(f"{name:>12} {r['size_mb']:>8.2f} {r['accuracy']:>9.3f} {agree:>7.3f}"
+              f" {r['latency_ms_p50']:>7.2f} {r['latency_ms_p95']:>7.2f}")
+    print("\n✅ Export complete")
+    print("✅ Report saved at:", REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
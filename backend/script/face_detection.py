@@ -0,0 +1,111 @@
+import os
+import threading
+import numpy as np
+import cv2
+
+# ---------------- Face detection ----------------
+# Detection runs on a small grayscale copy of the upload, never on the full
+# photo: the image is box-reduced by an integer factor until its long side is
+# at most FACE_DETECT_MAX_SIDE, faces smaller than FACE_MIN_SIZE (in the small
+# image) are not searched for, and the winning box is mapped back to full
+# resolution so the crop keeps all the detail the CNN can use.
+#
+#   FACE_DETECTOR=haar   Haar cascade (default, ships with the repo)
+#   FACE_DETECTOR=dnn    OpenCV DNN res10 SSD face detector on CPU; needs
+#                        deploy.prototxt and res10_300x300_ssd_iter_140000.caffemodel
+#                        in FACE_DNN_MODEL_DIR (from the OpenCV samples)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CASCADE_PATH = os.path.join(BASE_DIR, "haarcascade_frontalface_default.xml")
+
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "haar")
+FACE_DETECT_MAX_SIDE = int(os.environ.get("FACE_DETECT_MAX_SIDE", "640"))
+FACE_MIN_SIZE = int(os.environ.get("FACE_MIN_SIZE", "40"))
+FACE_DNN_MODEL_DIR = os.environ.get("FACE_DNN_MODEL_DIR", os.path.join(BASE_DIR, "models", "face_dnn"))
+FACE_DNN_CONFIDENCE = float(os.environ.get("FACE_DNN_CONFIDENCE", "0.5"))
+
+DETECTORS = ("haar", "dnn")
+
+
+class HaarDetector:
+    """One cascade per server thread: a CascadeClassifier must not be shared by concurrent calls"""
+
+    def __init__(self, cascade_path=CASCADE_PATH, min_size=FACE_MIN_SIZE):
+        self.cascade_path = cascade_path
+        self.min_size = min_size
+        self._local = threading.local()
+        self._cascade()  # fail at load time, not on the first request
+
+    def _cascade(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                raise RuntimeError("❌ Haar Cascade not loaded")
+            self._local.cascade = cascade
+        return cascade
+
+    def detect(self, gray, rgb=None):
+        """Boxes (x, y, w, h) in `gray` coordinates"""
+        min_size = min(self.min_size, *gray.shape[:2])
+        return list(self._cascade().detectMultiScale(gray, 1.3, 5, minSize=(min_size, min_size)))
+
+
+class DNNDetector:
+    """res10 SSD (300x300 input); uses the color image, not the grayscale one"""
+
+    needs_color = True
+
+    def __init__(self, model_dir=FACE_DNN_MODEL_DIR, confidence=FACE_DNN_CONFIDENCE, min_size=FACE_MIN_SIZE):
+        prototxt = os.path.join(model_dir, "deploy.prototxt")
+        weights = os.path.join(model_dir, "res10_300x300_ssd_iter_140000.caffemodel")
+        if not (os.path.exists(prototxt) and os.path.exists(weights)):
+            raise FileNotFoundError(f"DNN face detector files not found in {model_dir}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+        self._lock = threading.Lock()  # setInput + forward on one shared net
+        self.confidence = confidence
+        self.min_size = min_size
+
+    def detect(self, gray, rgb=None):
+        h, w = gray.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(rgb, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]
+        boxes = []
+        for _, _, score, x1, y1, x2, y2 in detections:
+            if score < self.confidence:
+                continue
+            x1, y1 = max(0, int(x1 * w)), max(0, int(y1 * h))
+            x2, y2 = min(w, int(x2 * w)), min(h, int(y2 * h))
+            if min(x2 - x1, y2 - y1) >= min(self.min_size, h, w):
+                boxes.append((x1, y1, x2 - x1, y2 - y1))
+        return boxes
+
+
+def load_detector(name=FACE_DETECTOR):
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector: '{name}'. Use one of {DETECTORS}")
+    return HaarDetector() if name == "haar" else DNNDetector()
+
+
+def downscale(pil_image, max_side=FACE_DETECT_MAX_SIDE):
+    """Box-reduce by an integer factor so the long side is about max_side; returns (image, factor)"""
+    factor = max(1, max(pil_image.size) // max_side)
+    return (pil_image.reduce(factor) if factor > 1 else pil_image), factor
+
+
+def detect_largest_face(detector, pil_image, max_side=FACE_DETECT_MAX_SIDE):
+    """Largest face box (x, y, w, h) in full-resolution coordinates, or None"""
+    small, factor = downscale(pil_image, max_side)
+    rgb = np.asarray(small.convert("RGB")) if getattr(detector, "needs_color", False) else None
+    gray = np.asarray(small if small.mode == "L" else small.convert("L"))
+
+    boxes = detector.detect(gray, rgb)
+    if len(boxes) == 0:
+        return None
+
+    x, y, w, h = max(boxes, key=lambda f: f[2] * f[3])
+    full_w, full_h = pil_image.size
+    x, y = int(x * factor), int(y * factor)
+    return x, y, min(int(w * factor), full_w - x), min(int(h * factor), full_h - y)
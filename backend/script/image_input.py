@@ -0,0 +1,55 @@
+import os
+import threading
+from io import BytesIO
+import numpy as np
+import cv2
+from PIL import Image
+
+# ---------------- Image input ----------------
+# Uploads are decoded straight to a reduced RGB image: for JPEGs, draft() lets
+# the decoder scale by 1/2, 1/4 or 1/8 in the DCT domain, so a 12 MP photo
+# never exists in memory at full size. Face detection grays only its own
+# downscaled copy (face_detection.py); the CNN gets the RGB face crop, as in
+# training (train_emotion_model.py, color_mode="rgb") and in the int8
+# calibration (export_emotion_model.py).
+#
+# The face crop is resized and normalized into a per-thread, preallocated
+# (1, 224, 224, 3) float32 tensor instead of fresh arrays for every request.
+# The micro-batcher copies it into the batch, so it is free again as soon as
+# submit() returns.
+
+# Long side of the decoded image; faces are cropped from this resolution
+DECODE_MAX_SIDE = int(os.environ.get("FACE_DECODE_MAX_SIDE", "1024"))
+INPUT_SIZE = (224, 224)
+
+
+def open_rgb(source, max_side=DECODE_MAX_SIDE):
+    """Decode bytes or a file object to an RGB PIL image with long side ~max_side"""
+    image = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    # JPEG only (no-op for other formats): decode at reduced scale
+    width, height = image.size
+    scale = max_side / max(width, height)
+    if scale < 1:
+        image.draft("RGB", (int(width * scale), int(height * scale)))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    factor = max(1, round(max(image.size) / max_side))
+    return image.reduce(factor) if factor > 1 else image
+
+
+class FaceTensor(threading.local):
+    """One reusable CNN input buffer per thread"""
+
+    def __init__(self, size=INPUT_SIZE):
+        self.size = size
+        self.resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.tensor = np.empty((1, size[1], size[0], 3), dtype=np.float32)
+
+    def fill(self, face):
+        """Resize + mobilenet_v2 scaling ([0, 255] -> [-1, 1]) of an RGB crop, in place"""
+        if face.ndim == 2:
+            face = cv2.cvtColor(face, cv2.COLOR_GRAY2RGB)
+        cv2.resize(face, self.size, dst=self.resized)
+        np.multiply(self.resized, 1.0 / 127.5, out=self.tensor[0], casting="unsafe")
+        self.tensor -= 1.0
+        return self.tensor
@@ -0,0 +1,96 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+import numpy as np
+
+# ---------------- Micro-batching inference ----------------
+# Requests hand their input tensor to submit() and block on the result. One
+# worker thread takes the first waiting input, keeps collecting until it has
+# INFERENCE_MAX_BATCH inputs or INFERENCE_MAX_WAIT_MS has passed, runs a single
+# forward pass on the stacked batch and hands each request its own row.
+# Alone, a request waits at most max_wait; under load the CNN runs on full
+# batches instead of one face at a time.
+
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", "16"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Collect single inputs from many threads into batched predict_fn calls"""
+
+    def __init__(self, predict_fn, max_batch=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS, name="inference"):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._items = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, x, timeout=None):
+        """Predict for one input of shape (1, ...) and return its output row(s)"""
+        future = Future()
+        self._queue.put((x, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        depth = self._queue.qsize() + 1
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch, depth
+
+    def _run(self):
+        while True:
+            batch, depth = self._collect()
+            inputs = [x for x, _ in batch]
+            futures = [f for _, f in batch]
+            start = time.perf_counter()
+            try:
+                outputs = self.predict_fn(np.concatenate(inputs, axis=0))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            for x, future in zip(inputs, futures):
+                future.set_result(outputs[offset:offset + len(x)])
+                offset += len(x)
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_depths[depth] += 1
+                self._items += len(batch)
+                self._batches += 1
+                self._busy_seconds += elapsed
+
+    def stats(self):
+        """Queue depth now, plus histograms of batch size and queue depth seen per batch"""
+        with self._stats_lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "busy_seconds": round(self._busy_seconds, 3),
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_depth_histogram": {str(k): v for k, v in sorted(self._queue_depths.items())},
+            }
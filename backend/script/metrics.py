@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response
+
+# ---------------- Metrics ----------------
+# Prometheus text exposition (format 0.0.4) without the client library:
+# latency histograms per pipeline stage, plus gauges read at scrape time from
+# the components that already keep their own counters (batcher queue depth,
+# catalog size, cache hit rates, ...).
+#
+#   with scan_latency.time("detect"):
+#       ...
+#
+# Serve registry.render() on GET /metrics (see metrics_response).
+
+# Seconds; fine at the low end, where in-memory stages live
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(label, value):
+    return f'{label}="{value}"' if label else ""
+
+
+def _line(name, labels, value):
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one optional label (e.g. stage)"""
+
+    def __init__(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, label_value=""):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, label_value=""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label_value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_value, counts in sorted(series.items()):
+            base = _labels(self.label, label_value)
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(_line(f"{self.name}_bucket", f'{base}{sep}le="{bound}"', cumulative))
+            lines.append(_line(f"{self.name}_sum", base, round(counts[-1], 6)))
+            lines.append(_line(f"{self.name}_count", base, cumulative))
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time: read() returns a number, or {label value: number} when labelled"""
+
+    def __init__(self, name, help_text, read, label=None, kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.label = label
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []  # component not loaded yet (e.g. during startup)
+        if value is None:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(value, dict):
+            for label_value, v in sorted(value.items()):
+                lines.append(_line(self.name, _labels(self.label, label_value), float(v)))
+        else:
+            lines.append(_line(self.name, "", float(value)))
+        return lines
+
+
+class Registry:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = []
+
+    def histogram(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        metric = Histogram(f"{self.prefix}_{name}", help_text, label, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, read, label=None):
+        self._metrics.append(Gauge(f"{self.prefix}_{name}", help_text, read, label))
+
+    def counter(self, name, help_text, read, label=None):
+        """Monotonic count kept by another component, read at scrape time"""
+        self._metrics.append(Gauge(f"{self.prefix}_{name}", help_text, read, label, kind="counter"))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def metrics_response(registry):
+    return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,69 @@
+import numpy as np
+
+# ---------------- Varied ranking (vectorized) ----------------
+# Same rules as the original per-song loop in emotion_api, on whole arrays:
+#   diversity = emotion score x recency penalty x jitter x tempo factor
+#     recency penalty 0.5 for songs the user saw recently, else 1.0
+#     jitter uniform in [0.8, 1.2)
+#     tempo factor 1 + (tempo - 120) / 240
+#   top band   = the TOP_BAND songs with the highest diversity
+#   selection  = 2 from score > 0.7, 2 from 0.4..0.7, 1 from < 0.4 (random
+#                within each band), topped up at random from the rest of the
+#                top band, then shuffled
+
+TOP_BAND = 20
+N_SELECTED = 5
+RECENCY_PENALTY = 0.5
+JITTER = (0.8, 1.2)
+
+# Score bands (on the emotion score, not the diversity score) and how many to draw from each
+HIGH_SCORE = 0.7
+LOW_SCORE = 0.4
+BAND_QUOTAS = np.array([2, 2, 1])
+
+_rng = np.random.default_rng()
+
+
+def diversity_scores(scores, tempos, recent_rows=None, rng=_rng):
+    """Emotion score adjusted for recency, tempo and a random jitter, for every song"""
+    diversity = scores * rng.uniform(JITTER[0], JITTER[1], size=len(scores))
+    diversity *= 1.0 + (tempos - 120.0) / 240.0
+    if recent_rows is not None and len(recent_rows):
+        diversity[recent_rows] *= RECENCY_PENALTY
+    return diversity
+
+
+def top_band(diversity, size=TOP_BAND):
+    """Rows of the `size` highest diversity scores, best first (O(N) selection + a tiny sort)"""
+    size = min(size, len(diversity))
+    if size == 0:
+        return np.zeros(0, dtype=np.int64)
+    band = np.argpartition(-diversity, size - 1)[:size]
+    return band[np.argsort(-diversity[band], kind="stable")]
+
+
+def stratified_pick(band_scores, n=N_SELECTED, rng=_rng):
+    """Positions into the top band: quota per score band, then random top-up, shuffled"""
+    bands = np.where(band_scores > HIGH_SCORE, 0, np.where(band_scores >= LOW_SCORE, 1, 2))
+
+    # Random order within each band; the first `quota` of each band are drawn
+    order = np.lexsort((rng.random(len(bands)), bands))
+    sorted_bands = bands[order]
+    rank_in_band = np.arange(len(order)) - np.searchsorted(sorted_bands, sorted_bands)
+    taken = rank_in_band < BAND_QUOTAS[sorted_bands]
+
+    picked = order[taken]
+    rest = order[~taken]
+    needed = max(0, n - len(picked))
+    if needed and len(rest):
+        picked = np.concatenate([picked, rng.permutation(rest)[:needed]])
+    return rng.permutation(picked)
+
+
+def rank_varied(scores, tempos, recent_rows=None, rng=_rng):
+    """Rows of the selected songs and their emotion scores"""
+    scores = np.asarray(scores, dtype=np.float32)
+    diversity = diversity_scores(scores, np.asarray(tempos, dtype=np.float32), recent_rows, rng)
+    band = top_band(diversity)
+    rows = band[stratified_pick(scores[band], rng=rng)]
+    return rows, scores[rows]
@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+from functools import wraps
+from flask import jsonify
+
+# ---------------- Serving ----------------
+# `python emotion_api.py` / `python working_api.py` now start a production
+# server; `--dev` (or SERVE_MODE=dev) keeps the old Flask debug server with
+# the reloader.
+#
+# Production uses waitress: one asynchronous I/O loop accepts and buffers all
+# connections (slow clients and uploads never hold a worker) and hands
+# complete requests to SERVE_THREADS worker threads. Image decoding (PIL),
+# detection (OpenCV) and inference (TF / TFLite) release the GIL, so worker
+# threads run them on all cores in parallel within one process, sharing one
+# copy of the models and the catalog.
+#
+# WebSockets (/api/scan-stream) need a server that can upgrade connections;
+# waitress cannot, so a process about to serve through waitress leaves those
+# routes out (supports_websockets()). Run the same app under gunicorn to keep
+# them, or without waitress installed / with --dev (Werkzeug upgrades too):
+#   gunicorn -k gthread --threads 16 -b 0.0.0.0:5000 emotion_api:app
+#
+#   SERVE_MODE              production | dev
+#   SERVE_THREADS           worker threads (default 2 x cores)
+#   SERVE_CONNECTION_LIMIT  open connections accepted before new ones wait
+#   SCAN_CONCURRENCY        scans doing CPU work at once (default = cores)
+#   SCAN_QUEUE_LIMIT        scans allowed to wait for a slot before 503
+
+CPU_COUNT = os.cpu_count() or 1
+SERVE_MODE = os.environ.get("SERVE_MODE", "production")
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", str(2 * CPU_COUNT)))
+SERVE_CONNECTION_LIMIT = int(os.environ.get("SERVE_CONNECTION_LIMIT", "200"))
+SCAN_CONCURRENCY = int(os.environ.get("SCAN_CONCURRENCY", str(CPU_COUNT)))
+SCAN_QUEUE_LIMIT = int(os.environ.get("SCAN_QUEUE_LIMIT", str(4 * CPU_COUNT)))
+
+
+class ConcurrencyLimit:
+    """At most `active` callers inside at once, at most `queued` waiting; the rest are turned away"""
+
+    def __init__(self, active=SCAN_CONCURRENCY, queued=SCAN_QUEUE_LIMIT):
+        self.active = max(1, active)
+        self.queued = max(0, queued)
+        self._slots = threading.BoundedSemaphore(self.active)
+        self._lock = threading.Lock()
+        self._inside = 0
+        self._waiting = 0
+        self.rejected = 0
+
+    def try_enter(self):
+        with self._lock:
+            if self._inside >= self.active and self._waiting >= self.queued:
+                self.rejected += 1
+                return False
+            self._waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+            self._inside += 1
+        return True
+
+    def leave(self):
+        with self._lock:
+            self._inside -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._inside,
+                "waiting": self._waiting,
+                "max_active": self.active,
+                "max_waiting": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+def limit_concurrency(limit, busy_response=None):
+    """Route decorator: run under `limit`, answer 503 when it is full"""
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not limit.try_enter():
+                body = busy_response or {"error": "Server busy, try again"}
+                return jsonify(body), 503
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limit.leave()
+        return wrapper
+    return decorate
+
+
+def server_name():
+    """Server run() uses in this process: dev | waitress | werkzeug"""
+    if SERVE_MODE == "dev" or "--dev" in sys.argv:
+        return "dev"
+    try:
+        import waitress  # noqa: F401
+    except ImportError:
+        return "werkzeug"
+    return "waitress"
+
+
+def supports_websockets():
+    """False when run() will serve through waitress, which cannot upgrade connections"""
+    return server_name() != "waitress"
+
+
+def run(app, host="0.0.0.0", port=5000):
+    """Serve `app` in production mode, or with the Flask debug server when asked to"""
+    server = server_name()
+    if server == "dev":
+        print("🛠️  Development server (debug + reloader)")
+        app.run(host=host, port=port, debug=True)
+        return
+
+    if server == "werkzeug":
+        # Still threaded and without the reloader, just less robust under many connections
+        print("⚠️ waitress not installed (pip install waitress): using the threaded Werkzeug server")
+        app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)
+        return
+
+    from waitress import serve
+    print(f"🚀 Production server: {SERVE_THREADS} worker threads, up to {SERVE_CONNECTION_LIMIT} connections")
+    serve(app, host=host, port=port, threads=SERVE_THREADS, connection_limit=SERVE_CONNECTION_LIMIT)
@@ -0,0 +1,355 @@
+import os
+import sys
+import threading
+import time
+import tempfile
+import hashlib
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+import numpy as np
+
+# ---------------- Session history ----------------
+# Recently shown song ids per user/session, so the APIs avoid repeats. Every
+# backend is bounded: a session keeps its last SESSION_MAX_RECENT ids, sessions
+# idle for SESSION_TTL seconds expire, and (in-process / shared-memory) at most
+# SESSION_MAX sessions are kept, least recently used evicted first.
+#
+#   SESSION_STORE=memory   per-process dict: LRU order + ring buffer + id counts,
+#                          every operation O(1)
+#   SESSION_STORE=shared   one shared-memory table for all server processes on
+#                          the host (gunicorn workers): sessions hash into sets
+#                          of SESSION_SHARED_WAYS slots, LRU within a set;
+#                          membership is a compare over SESSION_MAX_RECENT ids
+#   SESSION_STORE=mongo    "session_history" collection with a TTL index on
+#                          expires_at; consistent across hosts
+#
+# All of them: recent(key) -> ids oldest first, add(key, ids), reset(key),
+# stats(); safe to call from any server thread.
+
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "10000"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+SESSION_MAX_RECENT = int(os.environ.get("SESSION_MAX_RECENT", "20"))
+SESSION_SHARED_NAME = os.environ.get("SESSION_SHARED_NAME", "music_sessions")
+SESSION_SHARED_WAYS = int(os.environ.get("SESSION_SHARED_WAYS", "8"))
+SESSION_COLLECTION = "session_history"
+
+STORES = ("memory", "shared", "mongo")
+
+
+class _Session:
+    """Ring buffer of the last ids plus a count per id, for O(1) membership"""
+
+    __slots__ = ("ring", "counts", "expires")
+
+    def __init__(self, max_recent):
+        self.ring = deque(maxlen=max_recent)
+        self.counts = {}
+        self.expires = 0.0
+
+    def push(self, song_id):
+        if len(self.ring) == self.ring.maxlen:
+            dropped = self.ring[0]
+            if self.counts[dropped] == 1:
+                del self.counts[dropped]
+            else:
+                self.counts[dropped] -= 1
+        self.ring.append(song_id)
+        self.counts[song_id] = self.counts.get(song_id, 0) + 1
+
+
+class MemoryStore:
+    def __init__(self, max_sessions=SESSION_MAX, ttl=SESSION_TTL, max_recent=SESSION_MAX_RECENT):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.max_recent = max_recent
+        self._sessions = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def _live(self, key, now):
+        session = self._sessions.get(key)
+        if session is not None and session.expires <= now:
+            del self._sessions[key]
+            self.expired += 1
+            return None
+        return session
+
+    def recent(self, key):
+        with self._lock:
+            session = self._live(key, time.time())
+            return list(session.ring) if session else []
+
+    def contains(self, key, song_id):
+        with self._lock:
+            session = self._live(key, time.time())
+            return session is not None and song_id in session.counts
+
+    def add(self, key, song_ids):
+        now = time.time()
+        with self._lock:
+            session = self._live(key, now)
+            if session is None:
+                session = self._sessions[key] = _Session(self.max_recent)
+            else:
+                self._sessions.move_to_end(key)
+            session.expires = now + self.ttl
+            for song_id in song_ids:
+                session.push(song_id)
+            self._evict(now)
+
+    def _evict(self, now):
+        # Expired sessions first (they sit at the old end), then the LRU ones over the cap
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.expires > now and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+            if session.expires > now:
+                self.evicted += 1
+            else:
+                self.expired += 1
+
+    def reset(self, key):
+        with self._lock:
+            return self._sessions.pop(key, None) is not None
+
+    def stats(self):
+        with self._lock:
+            self._evict(time.time())
+            return {
+                "backend": "memory",
+                "active_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_recent_songs": self.max_recent,
+                "ttl_seconds": self.ttl,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
+
+
+class _FileLock:
+    """Cross-process lock for the shared table (flock; plain thread lock where unavailable)"""
+
+    def __init__(self, name):
+        self._thread_lock = threading.Lock()
+        self._file = None
+        try:
+            import fcntl
+            self._fcntl = fcntl
+            self._file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+")
+        except ImportError:
+            print("⚠️ No fcntl: the shared session table is only locked within this process")
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._file is not None:
+            self._fcntl.flock(self._file, self._fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._fcntl.flock(self._file, self._fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class SharedMemoryStore:
+    """
+    Fixed-size table in a named shared-memory block, attached by every process
+    that opens the same name. A session hashes to one set of `ways` slots; it
+    takes its own slot, else an expired one, else the least recently used.
+    Ids are stored as fixed-width ASCII (ObjectId hex strings fit).
+    """
+
+    ID_BYTES = 24
+    _MAGIC = 0x53455353
+
+    def __init__(self, name=SESSION_SHARED_NAME, max_sessions=SESSION_MAX, ttl=SESSION_TTL,
+                 max_recent=SESSION_MAX_RECENT, ways=SESSION_SHARED_WAYS):
+        from multiprocessing import shared_memory
+
+        self.ways = max(1, ways)
+        self.n_sets = max(1, -(-max_sessions // self.ways))
+        self.ttl = ttl
+        self.max_recent = max_recent
+        n_slots = self.n_sets * self.ways
+
+        self._dtype = np.dtype([
+            ("key", np.uint64),
+            ("last_used", np.float64),
+            ("expires", np.float64),  # 0 = empty slot
+            ("head", np.int32),       # next ring position to write
+            ("count", np.int32),
+            ("ids", f"S{self.ID_BYTES}", (max_recent,)),
+        ])
+        header = np.dtype([("magic", np.uint32), ("n_sets", np.uint32), ("ways", np.uint32), ("max_recent", np.uint32)])
+        size = header.itemsize + n_slots * self._dtype.itemsize
+
+        # Create-or-attach under the lock, so nobody attaches before the header is written
+        self._lock = _FileLock(name)
+        with self._lock:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                created = True
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+                created = False
+            # Outlive the process that created it; other workers may still be attached
+            if sys.version_info < (3, 13):
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+
+            self._header = np.ndarray((), dtype=header, buffer=self._shm.buf)
+            layout = (self._MAGIC, self.n_sets, self.ways, max_recent)
+            if created:
+                self._header[()] = layout
+            elif tuple(int(v) for v in self._header[()]) != layout:
+                raise RuntimeError(f"Shared session table '{name}' exists with another layout; "
+                                   f"stop all workers or use another SESSION_SHARED_NAME")
+        self._slots = np.ndarray((self.n_sets, self.ways), dtype=self._dtype,
+                                 buffer=self._shm.buf, offset=header.itemsize)
+
+    @staticmethod
+    def _hash(key):
+        # Stable across processes (unlike hash()); 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "little") or 1
+
+    def _find(self, key_hash, now):
+        """(set, way) of a live session, or None"""
+        row = self._slots[key_hash % self.n_sets]
+        ways = np.flatnonzero((row["key"] == key_hash) & (row["expires"] > now))
+        return (key_hash % self.n_sets, int(ways[0])) if len(ways) else None
+
+    def _ids(self, slot):
+        ring = slot["ids"][:slot["count"]] if slot["count"] < self.max_recent else np.roll(slot["ids"], -int(slot["head"]))
+        return [value.decode() for value in ring]
+
+    def recent(self, key):
+        with self._lock:
+            found = self._find(self._hash(key), time.time())
+            return self._ids(self._slots[found]) if found else []
+
+    def contains(self, key, song_id):
+        """One vectorized compare of the encoded id against the session's ring, no decoding"""
+        encoded = str(song_id).encode()[:self.ID_BYTES]
+        with self._lock:
+            found = self._find(self._hash(key), time.time())
+            if found is None:
+                return False
+            slot = self._slots[found]
+            return bool((slot["ids"][:slot["count"]] == encoded).any())
+
+    def add(self, key, song_ids):
+        now = time.time()
+        key_hash = self._hash(key)
+        with self._lock:
+            found = self._find(key_hash, now)
+            if found is None:
+                row = self._slots[key_hash % self.n_sets]
+                # Empty or expired slots have expires <= now, so they sort before any live one
+                way = int(np.argmin(np.where(row["expires"] > now, row["last_used"], -1.0)))
+                found = (key_hash % self.n_sets, way)
+                self._slots[found] = (key_hash, now, now, 0, 0, np.zeros(self.max_recent, dtype=f"S{self.ID_BYTES}"))
+            slot = self._slots[found]
+            for song_id in song_ids:
+                slot["ids"][slot["head"]] = str(song_id).encode()[:self.ID_BYTES]
+                slot["head"] = (slot["head"] + 1) % self.max_recent
+                slot["count"] = min(slot["count"] + 1, self.max_recent)
+            slot["last_used"] = now
+            slot["expires"] = now + self.ttl
+            self._slots[found] = slot
+
+    def reset(self, key):
+        with self._lock:
+            found = self._find(self._hash(key), time.time())
+            if found:
+                self._slots[found] = (0, 0.0, 0.0, 0, 0, np.zeros(self.max_recent, dtype=f"S{self.ID_BYTES}"))
+            return found is not None
+
+    def stats(self):
+        with self._lock:
+            active = int((self._slots["expires"] > time.time()).sum())
+        return {
+            "backend": "shared",
+            "name": self._shm.name,
+            "active_sessions": active,
+            "max_sessions": self.n_sets * self.ways,
+            "max_recent_songs": self.max_recent,
+            "ttl_seconds": self.ttl,
+        }
+
+    def close(self, unlink=False):
+        """Detach; unlink=True removes the table once the last server is gone"""
+        self._header = self._slots = None
+        self._shm.close()
+        if unlink:
+            if sys.version_info < (3, 13):
+                from multiprocessing import resource_tracker
+                resource_tracker.register(self._shm._name, "shared_memory")  # unlink() unregisters it again
+            self._shm.unlink()
+
+
+class MongoStore:
+    """One document per session; MongoDB deletes it once expires_at has passed"""
+
+    def __init__(self, collection, ttl=SESSION_TTL, max_recent=SESSION_MAX_RECENT):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_recent = max_recent
+        collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def recent(self, key):
+        # The TTL monitor runs about once a minute, so filter expired documents too
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"ids": 1})
+        return doc["ids"] if doc else []
+
+    def contains(self, key, song_id):
+        return self.collection.count_documents(
+            {"_id": key, "ids": song_id, "expires_at": {"$gt": datetime.utcnow()}}, limit=1) > 0
+
+    def add(self, key, song_ids):
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": key},
+            [{"$set": {
+                # Restart an expired session the TTL monitor has not removed yet
+                "ids": {"$slice": [
+                    {"$concatArrays": [
+                        {"$cond": [{"$gt": ["$expires_at", now]}, {"$ifNull": ["$ids", []]}, []]},
+                        list(song_ids),
+                    ]},
+                    -self.max_recent,
+                ]},
+                "expires_at": now + timedelta(seconds=self.ttl),
+            }}],
+            upsert=True,
+        )
+
+    def reset(self, key):
+        return self.collection.delete_one({"_id": key}).deleted_count > 0
+
+    def stats(self):
+        return {
+            "backend": "mongo",
+            "collection": self.collection.name,
+            "active_sessions": self.collection.estimated_document_count(),
+            "max_recent_songs": self.max_recent,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def load_session_store(name=SESSION_STORE, db=None, **options):
+    """Session store by name; `db` (a pymongo Database) is needed for "mongo" """
+    if name not in STORES:
+        raise ValueError(f"Unknown session store: '{name}'. Use one of {STORES}")
+    if name == "memory":
+        store = MemoryStore(**options)
+    elif name == "shared":
+        store = SharedMemoryStore(**options)
+    else:
+        if db is None:
+            raise ValueError("SESSION_STORE=mongo needs a MongoDB connection")
+        options.pop("max_sessions", None)  # bounded by the TTL index instead
+        store = MongoStore(db[SESSION_COLLECTION], **options)
+    print(f"✅ Session store: {name}")
+    return store
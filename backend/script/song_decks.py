@@ -0,0 +1,190 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------- Shuffle decks ----------------
+# working_scan deals songs like cards: each session gets its own shuffled deck
+# of the song ids for an emotion, five are dealt per request, and the deck is
+# reshuffled once it runs out, so nothing repeats until every song was heard.
+# Songs the session saw most recently go to the bottom of a fresh deck, so the
+# end of one deck and the start of the next do not overlap.
+#
+# The ids per emotion come from an in-memory index (one projected scan,
+# refreshed when the collection changes); the documents for a hand come from
+# a bounded cache, and whatever is missing from one `$in` query.
+#
+# "Changes" means the song count, the newest _id or the newest updated_at
+# (all index lookups): inserts, deletes and edits that stamp updated_at, as
+# the recommender's --update expects. Writers that do not stamp it are picked
+# up by a full reload at least every DECK_INDEX_MAX_AGE seconds; each reload
+# bumps the version, which also clears SongCache.
+
+DECK_INDEX_CHECK_INTERVAL = float(os.environ.get("DECK_INDEX_CHECK_INTERVAL", "60"))
+DECK_INDEX_MAX_AGE = float(os.environ.get("DECK_INDEX_MAX_AGE", "600"))
+DECK_MAX_SESSIONS = int(os.environ.get("DECK_MAX_SESSIONS", "10000"))
+DECK_TTL = float(os.environ.get("DECK_TTL", "3600"))
+SONG_CACHE_SIZE = int(os.environ.get("SONG_CACHE_SIZE", "5000"))
+
+ANY_EMOTION = "*"
+SONG_FIELDS = {"title": 1, "filename": 1, "song_emotion": 1, "danceability": 1,
+               "energy": 1, "valence": 1, "acousticness": 1}
+
+
+class EmotionIndex:
+    """Song ids per song_emotion, reloaded when the collection's fingerprint changes or max_age passes"""
+
+    def __init__(self, collection, check_interval=DECK_INDEX_CHECK_INTERVAL, max_age=DECK_INDEX_MAX_AGE):
+        self.collection = collection
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._current = (0, {})  # (version, {emotion: [ids]}, plus ANY_EMOTION -> every id)
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    def _fingerprint_now(self):
+        """Song count, newest _id and newest updated_at"""
+        newest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        edited = self.collection.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])  # updated_at_1 index
+        return (
+            self.collection.estimated_document_count(),
+            newest["_id"] if newest else None,
+            edited.get("updated_at") if edited else None,
+        )
+
+    def get(self):
+        """(version, {emotion: [ids]}); at most one fingerprint check per interval"""
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return self._current
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                fingerprint = self._fingerprint_now()
+                if fingerprint != self._fingerprint or now - self._loaded_at >= self.max_age:
+                    self._load(fingerprint)
+                self._checked_at = now
+        return self._current
+
+    def _load(self, fingerprint):
+        ids = {ANY_EMOTION: []}
+        for song in self.collection.find({}, {"song_emotion": 1}):
+            ids.setdefault(song.get("song_emotion"), []).append(song["_id"])
+            ids[ANY_EMOTION].append(song["_id"])
+        self._current = (self._current[0] + 1, ids)
+        self._fingerprint = fingerprint
+        self._loaded_at = time.time()
+        print(f"🃏 Deck index: {len(ids[ANY_EMOTION])} songs, {len(ids) - 1} emotions")
+
+
+class SongCache:
+    """Bounded LRU of song documents by _id"""
+
+    def __init__(self, collection, size=SONG_CACHE_SIZE, projection=SONG_FIELDS):
+        self.collection = collection
+        self.size = size
+        self.projection = projection
+        self._songs = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, ids, version=None):
+        """Documents for `ids`, in that order; cache misses are read with one `$in` query"""
+        with self._lock:
+            if version != self.version:
+                # Catalog changed (new EmotionIndex version): cached documents may be stale
+                self._songs.clear()
+                self.version = version
+            found = {i: self._songs[i] for i in ids if i in self._songs}
+            for i in found:
+                self._songs.move_to_end(i)
+        missing = [i for i in ids if i not in found]
+        if missing:
+            for song in self.collection.find({"_id": {"$in": missing}}, self.projection):
+                found[song["_id"]] = song
+            with self._lock:
+                for i in missing:
+                    if i in found:
+                        self._songs[i] = found[i]
+                while len(self._songs) > self.size:
+                    self._songs.popitem(last=False)
+        with self._lock:
+            self.hits += len(ids) - len(missing)
+            self.misses += len(missing)
+        return [found[i] for i in ids if i in found]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached_songs": len(self._songs),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class DeckDealer:
+    """Per-session decks (one per emotion) over an EmotionIndex, sessions bounded by LRU + TTL"""
+
+    def __init__(self, index, max_sessions=DECK_MAX_SESSIONS, ttl=DECK_TTL):
+        self.index = index
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session -> (expires, {emotion: [version, cards, position]}), LRU first
+        self._lock = threading.Lock()
+        self.shuffles = 0
+
+    def _shuffle(self, ids, version, recent=(), last=()):
+        """New deck: unheard songs first, then recently heard ones, the hand just dealt at the bottom"""
+        cards = random.sample(ids, len(ids))
+        if recent or last:
+            cards.sort(key=lambda c: 2 if c in last else 1 if str(c) in recent else 0)  # stable
+        self.shuffles += 1
+        return [version, cards, 0]
+
+    def deal(self, session_id, emotion, n=5, recent=()):
+        """Up to n song ids for the session; falls back to all songs when the emotion has none"""
+        version, index = self.index.get()
+        if not index.get(emotion):
+            emotion = ANY_EMOTION
+        ids = index.get(emotion, [])
+        if not ids:
+            return []
+
+        now = time.time()
+        recent = set(recent)
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            decks = entry[1] if entry and entry[0] > now else {}
+            self._sessions[session_id] = (now + self.ttl, decks)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+            deck = decks.get(emotion)
+            if deck is None or deck[0] != version:
+                deck = decks[emotion] = self._shuffle(ids, version, recent)
+            _, cards, position = deck
+            hand = cards[position:position + n]
+            deck[2] += len(hand)
+
+            needed = min(n, len(ids)) - len(hand)
+            if needed > 0:
+                # Deck ran out: reshuffle and finish the hand from the new deck
+                deck = decks[emotion] = self._shuffle(ids, version, recent, set(hand))
+                hand += deck[1][:needed]
+                deck[2] = needed
+        return hand
+
+    def reset(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "shuffles": self.shuffles}
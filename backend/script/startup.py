@@ -0,0 +1,135 @@
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# ---------------- Startup phases ----------------
+# A service registers its loading steps as phases with their dependencies:
+#
+#   startup = Startup("emotion_api")
+#
+#   @startup.phase("mongo")
+#   def connect(): ...
+#
+#   @startup.phase("catalog", after=("mongo", "recommender"))
+#   def load_catalog(): ...
+#
+# start() runs them in a background thread: every phase whose dependencies
+# are done runs at once on a thread pool (model files, Mongo and the face
+# detector load side by side), and the service reports ready only when all
+# phases succeeded. Each phase's wall time is logged, plus a breakdown at
+# the end, so slow cold starts can be traced to one step.
+#
+# The server can bind its port right away: requests check startup.ready, and
+# on_finish() callbacks run once loading is over (e.g. to print a banner).
+
+
+class Startup:
+    def __init__(self, name, max_workers=4):
+        self.name = name
+        self.max_workers = max_workers
+        self._phases = {}
+        self._timings = {}
+        self._errors = {}
+        self._started_at = None
+        self._total_seconds = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def phase(self, name, after=()):
+        """Decorator: register fn as phase `name`, run after the phases in `after`"""
+        def register(fn):
+            self._phases[name] = (fn, tuple(after))
+            return fn
+        return register
+
+    def on_finish(self, callback):
+        """Call callback(ready) once startup finished (right away if it already has)"""
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return callback
+        callback(self.ready)
+        return callback
+
+    def start(self):
+        """Run every phase in the background; returns immediately"""
+        threading.Thread(target=self.run, name=f"{self.name}-startup", daemon=True).start()
+        return self
+
+    def run(self):
+        self._started_at = time.perf_counter()
+        pending = dict(self._phases)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-load") as pool:
+            while pending or running:
+                for name, (fn, after) in list(pending.items()):
+                    if any(dep in self._errors for dep in after):
+                        self._errors[name] = f"skipped: dependency failed ({', '.join(after)})"
+                        del pending[name]
+                    elif all(dep in self._timings for dep in after):
+                        running[pool.submit(self._run_phase, name, fn)] = name
+                        del pending[name]
+                if not running:
+                    break  # the rest wait on failed or unknown phases
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+
+        for name, (_, after) in pending.items():
+            failed = [dep for dep in after if dep in self._errors or dep in pending]
+            self._errors[name] = f"skipped: dependency failed ({', '.join(failed)})" if failed else "never ran"
+        self._total_seconds = time.perf_counter() - self._started_at
+        self._log_summary()
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self.ready)
+            except Exception:
+                traceback.print_exc()
+
+    def _run_phase(self, name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self._errors[name] = str(e)
+            print(f"❌ Startup phase '{name}' failed after {time.perf_counter() - start:.2f}s: {e}")
+            traceback.print_exc()
+            return
+        self._timings[name] = time.perf_counter() - start
+        print(f"⏱️  Startup phase '{name}': {self._timings[name]:.2f}s")
+
+    def _log_summary(self):
+        print(f"\n⏱️  {self.name} startup: {self._total_seconds:.2f}s wall"
+              f" ({sum(self._timings.values()):.2f}s of phase time)")
+        for name, seconds in sorted(self._timings.items(), key=lambda item: -item[1]):
+            print(f"   {name:<16} {seconds:>7.2f}s")
+        for name, error in self._errors.items():
+            print(f"   {name:<16} FAILED  {error}")
+        print("✅ Ready" if not self._errors else "❌ Not ready: startup failed")
+
+    @property
+    def ready(self):
+        return self._done.is_set() and not self._errors
+
+    def wait(self, timeout=None):
+        """Block until startup finished; True if it succeeded"""
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self):
+        elapsed = None
+        if self._started_at is not None:
+            elapsed = self._total_seconds if self._total_seconds is not None else time.perf_counter() - self._started_at
+        return {
+            "ready": self.ready,
+            "finished": self._done.is_set(),
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "phases": {name: round(seconds, 3) for name, seconds in self._timings.items()},
+            "pending": [name for name in self._phases if name not in self._timings and name not in self._errors],
+            "errors": dict(self._errors),
+        }
@@ -1,12 +1,15 @@
-from pymongo import MongoClient
 import gridfs
 import os
+import sys
+
+# Modules shared with backend/ml
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from music_db import get_db
 
 # -----------------------------
 # MongoDB Connection
 # -----------------------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["musicDB"]
+db = get_db()
 
 # GridFS with collection name "image"
 fs = gridfs.GridFS(db, collection="image")
@@ -0,0 +1,69 @@
+import io
+from pathlib import Path
+import numpy as np
+import pytest
+from PIL import Image
+from face_cache import FaceResultCache, dhash
+
+# python -m pytest backend/script/test_face_cache.py
+
+FACES_DIR = Path(__file__).resolve().parent.parent.parent / "image" / "faces"
+PREDS = np.array([0.7, 0.2, 0.1], dtype=np.float32)
+
+
+def load_face(label, index=0):
+    paths = sorted((FACES_DIR / label).glob("*.jpg"))
+    if len(paths) <= index:
+        pytest.skip(f"no faces under {FACES_DIR / label}")
+    return np.asarray(Image.open(paths[index]).convert("RGB"))
+
+
+def noisy(face, sigma=3.0):
+    noise = np.random.default_rng(0).normal(0, sigma, face.shape)
+    return np.clip(face + noise, 0, 255).astype(np.uint8)
+
+
+def shifted(face, dx=2, dy=2):
+    return face[dy:, dx:]
+
+
+def reencoded(face, quality=75):
+    buffer = io.BytesIO()
+    Image.fromarray(face).save(buffer, "JPEG", quality=quality)
+    return np.asarray(Image.open(buffer).convert("RGB"))
+
+
+@pytest.fixture
+def cache():
+    face = load_face("happy")
+    cache = FaceResultCache(len(PREDS))
+    cache.put("10.0.0.1", dhash(face), PREDS)
+    return cache, face
+
+
+@pytest.mark.parametrize("variant", [noisy, shifted, reencoded])
+def test_near_identical_crop_hits(cache, variant):
+    cache, face = cache
+    preds = cache.get("10.0.0.1", dhash(variant(face)))
+    assert preds is not None
+    np.testing.assert_array_equal(preds, PREDS)
+
+
+@pytest.mark.parametrize("label", ["happy", "neutral", "sad"])
+def test_different_face_misses(cache, label):
+    cache, _ = cache
+    other = load_face(label, index=1)
+    assert cache.get("10.0.0.1", dhash(other)) is None
+
+
+def test_other_client_misses(cache):
+    cache, face = cache
+    assert cache.get("10.0.0.2", dhash(face)) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire():
+    face = load_face("happy")
+    cache = FaceResultCache(len(PREDS), ttl=0)
+    cache.put("10.0.0.1", dhash(face), PREDS)
+    assert cache.get("10.0.0.1", dhash(face)) is None
@@ -1,17 +1,22 @@
 import os
+import sys
+import json
 import joblib
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
-from pymongo import MongoClient
+from catalog_snapshot import FEATURES, CatalogSnapshot, model_version
+
+# Modules shared with backend/ml
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from music_db import get_db
 
 # ---------------- DB CONNECTION ----------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["musicDB"]
+db = get_db()
 songs_collection = db["songs"]
 
 # ---------------- FETCH SONG DATA ----------------
-songs = list(songs_collection.find())
+songs = list(songs_collection.find({}, {f: 1 for f in FEATURES}))
 
 if len(songs) == 0:
     raise Exception("❌ No songs found in database")
@@ -184,12 +189,25 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-joblib.dump(model, os.path.join(MODEL_DIR, "song_recommender.joblib"))
+model_path = os.path.join(MODEL_DIR, "song_recommender.joblib")
+joblib.dump(model, model_path)
 joblib.dump(label_encoder, os.path.join(MODEL_DIR, "emotion_encoder.joblib"))
 
+# Same content hash emotion_api computes when it loads the model
+recommender_version = model_version(model_path)
+with open(os.path.join(MODEL_DIR, "song_recommender.meta.json"), "w") as f:
+    json.dump({"version": recommender_version, "classes": list(label_encoder.classes_)}, f, indent=2)
+
+# ---------------- PRECOMPUTE SONG PROBABILITIES ----------------
+# Scores every song once and stores it on the document; the API only reads them
+# (and scores songs added or edited later when its catalog snapshot reloads)
+CatalogSnapshot(songs_collection, model=model, model_version=recommender_version).reload()
+
 print("\n✅ Song recommender trained successfully")
 print("📁 Saved:")
 print("   - song_recommender.joblib")
 print("   - emotion_encoder.joblib")
+print("   - song_recommender.meta.json")
+print(f"   - per-song probabilities in songs.emotion_scores (model {recommender_version})")
 print(f"\n🎯 Model trained with {len(y)} songs")
 print(f"   Emotions: {', '.join(label_encoder.classes_)}")
\ No newline at end of file
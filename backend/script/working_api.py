@@ -1,35 +1,78 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from pymongo import MongoClient
-from bson import ObjectId
 import random
 import datetime
+import os
+import sys
+import time
+import serving
+from session_store import SESSION_STORE, load_session_store
+from song_decks import ANY_EMOTION, DeckDealer, EmotionIndex, SongCache
+from metrics import Registry, metrics_response
+
+# Modules shared with backend/ml
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from mongo_indexes import prepare_database
+from music_db import CatalogStats, get_db, ping, sample_songs
 
 app = Flask(__name__)
 CORS(app)
 
 # Connect to MongoDB
+songs_collection = None
+catalog_stats = None
 try:
-    client = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=3000)
-    db = client["musicDB"]
+    # Shared pooled client (see music_db.py)
+    ping()
+    db = get_db()
     songs_collection = db["songs"]
     print("✅ MongoDB connected successfully")
+
+    # Song counts (total / per emotion), cached for CATALOG_STATS_TTL seconds
+    catalog_stats = CatalogStats(songs_collection)
+    
+    # Indexes for the hot queries, then an explain() check for collection scans (see mongo_indexes.py).
+    # Only a warning when it fails (no index privileges, transient error): the API works without it
+    try:
+        prepare_database(db)
+    except Exception as e:
+        print(f"⚠️ Index setup failed, continuing without it: {e}")
     
-    # Check if we have songs
-    total_songs = songs_collection.count_documents({})
-    print(f"📊 Total songs in database: {total_songs}")
+    print(f"📊 Total songs in database: {catalog_stats.count()}")
     
 except Exception as e:
     print(f"❌ MongoDB error: {e}")
     songs_collection = None
+    catalog_stats = None
+
+# Recently shown song ids per session: memory | shared | mongo (SESSION_STORE, see session_store.py)
+session_history = load_session_store(SESSION_STORE, songs_collection.database if songs_collection is not None else None)
+
+# Song ids per emotion, per-session shuffle decks and a song document cache
+if songs_collection is not None:
+    deck_index = EmotionIndex(songs_collection)
+    song_decks = DeckDealer(deck_index)
+    song_cache = SongCache(songs_collection)
+
+# ---------------- Metrics ----------------
+# Time per working-scan stage plus cache / deck gauges, on GET /metrics (see metrics.py)
+metrics = Registry("working_api")
+stage_latency = metrics.histogram("stage_seconds", "Time spent in each working-scan stage", label="stage")
+scan_latency = metrics.histogram("scan_seconds", "End-to-end /api/working-scan time for answered scans")
 
-# Store session history in memory
-session_history = {}
+metrics.gauge("catalog_songs", "Songs in the per-emotion deck index", lambda: len(deck_index.get()[1].get(ANY_EMOTION, [])))
+metrics.counter("song_cache_requests_total", "Song document lookups", lambda: {"hit": song_cache.hits, "miss": song_cache.misses}, label="result")
+metrics.gauge("song_cache_hit_ratio", "Share of dealt songs served from the cache", lambda: song_cache.stats()["hit_rate"])
+metrics.gauge("deck_sessions", "Sessions holding shuffle decks", lambda: song_decks.stats()["sessions"])
+metrics.counter("deck_shuffles_total", "Decks shuffled", lambda: song_decks.shuffles)
+metrics.counter("catalog_stats_requests_total", "Song-count reads", lambda: {"cached": catalog_stats.hits, "refreshed": catalog_stats.refreshes} if catalog_stats is not None else None, label="result")
+metrics.gauge("sessions_active", "Sessions with a recent-song history", lambda: session_history.stats()["active_sessions"])
 
 @app.route("/api/working-scan", methods=["POST"])
 def working_scan():
     """Working API that returns DIFFERENT songs each time"""
     
+    started = time.perf_counter()
     try:
         data = request.get_json()
         session_id = data.get("session_id", "default")
@@ -49,69 +92,25 @@ def working_scan():
                 "songs": []
             }), 200
         
-        # Get ALL songs with this emotion
-        query = {"song_emotion": emotion}
-        all_songs = list(songs_collection.find(query))
+        # Next five songs from this session's shuffled deck for the emotion (see song_decks.py):
+        # no repeats until the deck runs out, documents from the cache or one $in query
+        with stage_latency.time("catalog_index"):
+            version, index = deck_index.get()
+        with stage_latency.time("session_history"):
+            recent = session_history.recent(session_id)
+        with stage_latency.time("ranking"):
+            song_ids = song_decks.deal(session_id, emotion, 5, recent=recent)
+        with stage_latency.time("catalog_fetch"):
+            selected_songs = song_cache.fetch(song_ids, version)
         
-        print(f"📝 Found {len(all_songs)} songs with emotion '{emotion}'")
-        
-        # If we have songs with this emotion
-        if all_songs:
-            # Get previously shown songs for this session
-            shown_songs = session_history.get(session_id, [])
-            
-            # Filter out already shown songs
-            available_songs = [song for song in all_songs 
-                              if str(song.get("_id", "")) not in shown_songs]
-            
-            print(f"📊 Available (not shown): {len(available_songs)} / Shown before: {len(shown_songs)}")
-            
-            # If we have enough new songs, use them
-            if len(available_songs) >= 5:
-                selected_songs = random.sample(available_songs, min(5, len(available_songs)))
-            else:
-                # Mix some new and some old songs
-                if available_songs:
-                    selected_songs = available_songs[:min(3, len(available_songs))]
-                    # Add some previously shown songs to make 5
-                    needed = 5 - len(selected_songs)
-                    if shown_songs and needed > 0:
-                        # Get song objects from IDs
-                        shown_song_objects = []
-                        for song_id in shown_songs[-10:]:  # Last 10 shown
-                            try:
-                                song = songs_collection.find_one({"_id": ObjectId(song_id)})
-                                if song and song not in selected_songs:
-                                    shown_song_objects.append(song)
-                            except:
-                                pass
-                        
-                        if shown_song_objects:
-                            selected_songs.extend(random.sample(shown_song_objects, 
-                                                              min(needed, len(shown_song_objects))))
-                else:
-                    # No new songs, shuffle all songs
-                    selected_songs = random.sample(all_songs, min(5, len(all_songs)))
-            
-            # Update session history
-            new_song_ids = [str(song.get("_id", "")) for song in selected_songs]
-            if session_id not in session_history:
-                session_history[session_id] = []
-            session_history[session_id].extend(new_song_ids)
-            
-            # Keep only last 20 songs per session
-            session_history[session_id] = session_history[session_id][-20:]
-            
-        else:
-            # No songs with this emotion, get any songs
-            print(f"⚠️ No songs for '{emotion}', getting random songs")
-            all_random_songs = list(songs_collection.find().limit(50))
-            selected_songs = random.sample(all_random_songs, min(5, len(all_random_songs)))
+        print(f"🃏 Dealt {len(selected_songs)} songs ({len(index.get(emotion, []))} with emotion '{emotion}')")
         
-        # SHUFFLE the selected songs for extra randomness
-        random.shuffle(selected_songs)
+        # Keeps only the last SESSION_MAX_RECENT (20) songs per session
+        with stage_latency.time("session_update"):
+            session_history.add(session_id, [str(song["_id"]) for song in selected_songs])
         
         # Format songs for frontend
+        serialize_start = time.perf_counter()
         result_songs = []
         for i, song in enumerate(selected_songs[:5]):  # Max 5 songs
             song_id = str(song.get("_id", f"song_{i}"))
@@ -153,18 +152,22 @@ def working_scan():
                 }
             })
         
-        print(f"✅ Returning {len(result_songs)} SHUFFLED songs")
-        for song in result_songs:
-            print(f"   🎵 {song['title']} (score: {song['score']})")
-        
-        return jsonify({
+        response = jsonify({
             "success": True,
             "emotion": emotion,
             "songs": result_songs,
             "session_id": session_id,
-            "total_songs_in_db": songs_collection.count_documents({}),
+            "total_songs_in_db": len(index.get(ANY_EMOTION, [])),
             "message": f"Found {len(result_songs)} songs for {emotion} mood"
-        }), 200
+        })
+        stage_latency.observe(time.perf_counter() - serialize_start, "serialization")
+        scan_latency.observe(time.perf_counter() - started)
+        
+        print(f"✅ Returning {len(result_songs)} SHUFFLED songs")
+        for song in result_songs:
+            print(f"   🎵 {song['title']} (score: {song['score']})")
+        
+        return response, 200
         
     except Exception as e:
         print(f"❌ API Error: {e}")
@@ -180,8 +183,9 @@ def working_scan():
 @app.route("/api/reset-session/<session_id>", methods=["GET"])
 def reset_session(session_id):
     """Reset song history for a session"""
-    if session_id in session_history:
-        session_history[session_id] = []
+    if songs_collection is not None:
+        song_decks.reset(session_id)
+    if session_history.reset(session_id):
         return jsonify({
             "success": True,
             "message": f"Session {session_id[:8]}... history cleared"
@@ -198,31 +202,36 @@ def get_songs_by_emotion(emotion):
         if songs_collection is None:
             return jsonify({"error": "MongoDB not connected"}), 500
         
-        songs = list(songs_collection.find({"song_emotion": emotion}))
+        songs = songs_collection.find({"song_emotion": emotion}, {"_id": 0, "title": 1}).limit(20)
         
         return jsonify({
             "success": True,
             "emotion": emotion,
-            "total_songs": len(songs),
-            "song_titles": [s.get("title", "Unknown") for s in songs[:20]]
+            "total_songs": catalog_stats.count(emotion) if catalog_stats is not None else None,
+            "song_titles": [s.get("title", "Unknown") for s in songs]
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Per-stage latency histograms, catalog size and cache hit rates (Prometheus text format)"""
+    return metrics_response(metrics)
+
 @app.route("/api/test", methods=["GET"])
 def test_api():
     """Test endpoint"""
+    connected = songs_collection is not None
+    counts = catalog_stats.get() if catalog_stats is not None else {"total": 0, "by_emotion": {}}
     stats = {
         "status": "online",
         "timestamp": datetime.datetime.now().isoformat(),
-        "mongo_connected": songs_collection is not None,
-        "total_songs": songs_collection.count_documents({}) if songs_collection else 0,
-        "active_sessions": len(session_history),
-        "emotions": {
-            "happy": songs_collection.count_documents({"song_emotion": "happy"}) if songs_collection else 0,
-            "sad": songs_collection.count_documents({"song_emotion": "sad"}) if songs_collection else 0,
-            "neutral": songs_collection.count_documents({"song_emotion": "neutral"}) if songs_collection else 0,
-        }
+        "mongo_connected": connected,
+        "total_songs": counts["total"],
+        "active_sessions": session_history.stats()["active_sessions"],
+        "decks": song_decks.stats() if connected else None,
+        "song_cache": song_cache.stats() if connected else None,
+        "emotions": {emotion: counts["by_emotion"].get(emotion, 0) for emotion in ["happy", "sad", "neutral"]}
     }
     return jsonify(stats), 200
 
@@ -235,20 +244,20 @@ if __name__ == "__main__":
     print("   GET  /api/reset-session/<id> - Reset session history")
     print("   GET  /api/get-songs/<emo>  - Get songs by emotion")
     print("   GET  /api/test             - Test API status")
+    print("   GET  /metrics              - Prometheus metrics")
     print("="*60)
     
-    if songs_collection is not None:
+    if catalog_stats is not None:
         # Count songs by emotion
         print("📊 Songs by emotion:")
         for emotion in ["happy", "sad", "neutral"]:
-            count = songs_collection.count_documents({"song_emotion": emotion})
-            print(f"   {emotion}: {count} songs")
+            print(f"   {emotion}: {catalog_stats.count(emotion)} songs")
         
         # Show sample songs
         print("\n🎵 Sample songs:")
         for emotion in ["happy", "sad", "neutral"]:
-            sample = songs_collection.find_one({"song_emotion": emotion})
-            if sample:
+            for sample in sample_songs(songs_collection, 1, match={"song_emotion": emotion}):
                 print(f"   {emotion}: {sample.get('title', 'Unknown')}")
     
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Production server unless --dev / SERVE_MODE=dev (see serving.py)
+    serving.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file